@@ -1,49 +1,196 @@
-from flask import Flask, request, jsonify, views
+from flask import Flask, request, jsonify, views, Response, stream_with_context, g
 from flask_cors import CORS
-from openai import OpenAI
-from module.Generator import execute_router
+from module.Generator import execute_router, execute_router_batch, stream_router
+from module.Retrieval import get_retriever, normalize_query_text
+from module.Metrics import logger, metrics, configure_logging, new_request_id
+from module.Jobs import JobManager, QueueFullError
+from module.Coalescing import SingleFlight
+from module.AnswerCache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
+from module.LLMClient import build_llm_client
+from module.Filters import SearchFilter, normalize_date
 from dotenv import load_dotenv
 import os
-import traceback
+import json
+import time
 
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+# OpenAI 호환 엔드포인트 (벤치마크 시 로컬 스텁 서버로 교체 가능)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", 'https://generativelanguage.googleapis.com/v1beta/openai/')
 
-api_client = OpenAI(
-  base_url='https://generativelanguage.googleapis.com/v1beta/openai/',
-  api_key=GOOGLE_API_KEY,
-)
+# 라우터/평가자/요약기가 공유하는 클라이언트: 토큰 버킷, 429/5xx 재시도, 호출 시간 제한, 연결 풀, 적응형 동시 호출 제한
+api_client = build_llm_client(LLM_BASE_URL, GOOGLE_API_KEY)
 
 
+configure_logging()
+
 app = Flask(__name__)
 
 # 개발 중인 React 앱(예: localhost:3000)에서 Flask 서버(예: localhost:5000)로 API를 요청할 때 필요.
 CORS(app)
 
+# 요청마다 ChromaDB를 여는 비용을 없애기 위해 서버 시작 시 검색 서비스를 미리 초기화.
+try:
+    get_retriever().warm_up()
+except Exception as e:
+    logger.warning("검색 서비스 초기화 실패 (첫 요청 시 다시 시도합니다): %s", e)
+
+
+@app.before_request
+def assign_request_id():
+    # 요청 상관관계 ID: 클라이언트가 X-Request-ID 를 보내면 그대로 사용
+    g.request_id = new_request_id(request.headers.get("X-Request-ID"))
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "-")
+    if request.endpoint != "prometheus_metrics":
+        labels = {"endpoint": request.endpoint or "unknown", "status": str(response.status_code)}
+        metrics.inc("llm_rag_http_requests_total", labels, help_text="HTTP requests by endpoint and status.")
+        metrics.observe("llm_rag_http_request_duration_seconds", time.perf_counter() - g.get("request_start", time.perf_counter()),
+                        {"endpoint": labels["endpoint"]}, help_text="HTTP request latency in seconds (streaming: until headers).")
+    return response
+
+
+MODEL_NAME = "gemini-2.5-flash"
+
+# 배치 분석 한 요청에 담을 수 있는 최대 아이디어 수
+BATCH_MAX_IDEAS = 500
+
+# 비동기 분석 작업용 워커 풀 (요청 스레드가 LLM 응답을 기다리며 묶이지 않도록)
+job_manager = JobManager()
+
+# 같은 아이디어가 동시에 들어오면 파이프라인을 한 번만 실행하고 결과를 공유 (직후 반복 요청은 짧게 캐시)
+idea_flight = SingleFlight("execute_router")
+
+# 표현만 다른 비슷한 아이디어는 이전 분석 결과를 재사용 (특허 컬렉션이 재구축되면 자동으로 비움)
+answer_cache = SemanticAnswerCache()
+
+
+def build_patent_entry(metadata: dict, eval_result: list) -> dict:
+    """
+    특허 메타데이터와 평가 결과 [eval_score, reason]를 Frontend 의 patentList 항목 형식으로 변환
+    """
+    return {
+        "matchstatus": "success",
+        "patentId": metadata.get('ApplicationNumber'),
+        "title": metadata.get('InventionName'),
+        "applicationDate": metadata.get('ApplicationDate'),
+        "applicant": metadata.get('Applicant'),
+        "summary": eval_result[1],
+        "relevanceScore": str(int(eval_result[0])/100)
+    }
+
+
+def parse_search_filters(data: dict):
+    """
+    요청 본문의 "filters": {"dateFrom", "dateTo", "applicants", "excludeApplicants"} 를 검색 도구 인자 형식으로 변환.
+    날짜는 "2015", "2015-03", "2015-03-01" 등을, 출원인은 이름 하나 또는 이름 목록을 받음.
+    필터가 없으면 None, 형식이 잘못되면 ValueError
+    """
+    raw = data.get('filters')
+    if not raw:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("'filters' must be an object.")
+
+    filters = {}
+    for key, arg in (("dateFrom", "date_from"), ("dateTo", "date_to")):
+        value = raw.get(key)
+        if value:
+            if normalize_date(value, end=arg == "date_to") is None:
+                raise ValueError(f"Invalid date in filters.{key}: {value!r}")
+            filters[arg] = str(value)
+    for key, arg in (("applicants", "applicants"), ("excludeApplicants", "exclude_applicants")):
+        value = raw.get(key)
+        if isinstance(value, str):
+            value = [value]
+        if value:
+            if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+                raise ValueError(f"filters.{key} must be a list of applicant names.")
+            filters[arg] = value
+    return filters or None
+
 
-def process_idea_text(text: str) -> dict:
+def filters_key(filters) -> str:
+    """정규화된 필터 조건 문자열 (같은 조건이면 표기가 달라도 같은 값). 필터가 없으면 빈 문자열"""
+    if not filters:
+        return ""
+    return json.dumps(SearchFilter(**filters).to_dict(), ensure_ascii=False, sort_keys=True)
+
+
+def is_complete_outcome(outcome) -> bool:
+    """
+    execute_router 결과를 캐시해도 되는지 여부. 모든 후보 평가와 요약이 성공한 결과만 캐시
+    (429 등으로 일부 평가가 빠졌거나 요약이 None 인 결과가 비슷한 아이디어 전체에 재사용되지 않도록)
+    """
+    success_bool, _, _, complete = outcome
+    return success_bool is True and complete
+
+
+def process_idea_text(text: str, filters: dict = None) -> dict:
     """
     Frontend에서 받은 텍스트(아이디어)를 처리하는 로직
 
    인터페이스 정의를 위한 임시 데이터 정의 
+    비슷한 아이디어의 이전 분석 결과가 답변 캐시에 있으면 파이프라인 없이 반환 (응답의 cached 가 True)
+    filters 가 있으면 검색 조건이 같은 요청끼리만 결과를 공유
+    """
+    response, _ = analyze_idea_shared(text, filters)
+    return response
+
+
+def analyze_idea_shared(text: str, filters: dict = None, pipeline=None):
+    """
+    /api/analyze-idea 와 비동기 작업이 함께 쓰는 분석 계층: 답변 캐시 조회 -> 동일 요청 합치기 -> pipeline 실행 -> 캐시 저장.
+    pipeline 은 execute_router 와 같은 인자를 받고 같은 형식의 결과를 반환해야 함 (동일 요청끼리 결과를 나눠 쓰므로)
+
+    반환값: (Frontend 응답 dict, success_bool). success_bool 은 캐시 적중 시 True, 파이프라인 오류 시 "error"
+    """
+    pipeline = execute_router if pipeline is None else pipeline
+    namespace = MODEL_NAME + filters_key(filters)
+    vector, fingerprint = None, None
+    if ANSWER_CACHE_ENABLED:
+        try:
+            retriever = get_retriever()
+            fingerprint = retriever.fingerprint()
+            vector = retriever.embed_query(text.strip())
+            cached = answer_cache.lookup(vector, namespace, fingerprint)
+            if cached is not None:
+                return dict(cached, cached=True), True
+        except Exception as e:
+            logger.warning("[답변 캐시] 조회 실패, 캐시 없이 진행합니다: %s", e)
+            vector = None
+
+    outcome, shared = idea_flight.do(
+        (normalize_query_text(text), namespace),
+        pipeline, text, model_name=MODEL_NAME, api_client=api_client, filters=filters,
+        cacheable=is_complete_outcome,
+    )
+    if shared:
+        logger.info("동일 아이디어의 파이프라인 결과를 재사용했습니다.")
+    response = build_idea_response(*outcome)
+    if vector is not None and is_complete_outcome(outcome):
+        answer_cache.store(vector, namespace, dict(response), fingerprint)
+    response["cached"] = False
+    return response, outcome[0]
+
+
+def build_idea_response(success_bool, eval_results, abstract_result, complete=False) -> dict:
+    """
+    execute_router 의 반환값을 Frontend 응답 형식({status, chatResponse, patentList})으로 변환
+    (complete 는 캐시 여부 판단에만 쓰이며 응답에는 포함하지 않음)
     """
-    success_bool, eval_results, abstract_result = execute_router(text, model_name="gemini-2.5-flash", api_client=api_client)
     patent_list = []
-    print(f"success_bool: {success_bool} 확인")
-    if  success_bool:
+    logger.info("success_bool: %s 확인", success_bool)
+    # success_bool 은 오류 시 "error" 문자열이므로 True 인 경우에만 평가 결과를 사용
+    if success_bool is True:
         for i in range(len(eval_results)):
-            patent_data = {
-                "matchstatus": "success",
-                "patentId": eval_results[i][0].get('ApplicationNumber'),
-                "title": eval_results[i][0].get('InventionName'),
-                "applicationDate": eval_results[i][0].get('ApplicationDate'),
-                "applicant": eval_results[i][0].get('Applicant'),
-                "summary": eval_results[i][1][1],
-                "relevanceScore": str(int(eval_results[i][1][0])/100)
-                    }
-            patent_list.append(patent_data)
+            patent_list.append(build_patent_entry(eval_results[i][0], eval_results[i][1]))
 
     response = {
-            "status": "success" if success_bool else "failed",
+            "status": "success" if success_bool is True else "failed",
             "chatResponse": abstract_result,
             "patentList": patent_list
             }
@@ -51,10 +198,88 @@ def process_idea_text(text: str) -> dict:
     return response
 
 
+def stream_idea_events(text: str, request_id: str = None, filters: dict = None):
+    """
+    stream_router 의 이벤트를 Frontend 용 NDJSON 라인으로 변환하는 제너레이터
+    """
+    # 제너레이터는 응답 전송 중에 실행되므로 요청 상관관계 ID 를 다시 설정
+    new_request_id(request_id)
+    for event in stream_router(text, model_name=MODEL_NAME, api_client=api_client, filters=filters):
+        if event["type"] == "evaluation":
+            event = {
+                "type": "patent",
+                "rank": event["index"],
+                "patent": build_patent_entry(event["metadata"], event["eval_result"]),
+            }
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def stream_batch_events(ideas: list, request_id: str = None, filters: dict = None):
+    """
+    execute_router_batch 결과를 아이디어가 끝나는 순서대로 NDJSON 라인으로 변환하는 제너레이터
+    """
+    new_request_id(request_id)
+    try:
+        for index, outcome in execute_router_batch(ideas, model_name=MODEL_NAME, api_client=api_client, filters=filters):
+            yield json.dumps({"type": "idea", "index": index, "result": build_idea_response(*outcome)}, ensure_ascii=False) + "\n"
+        yield json.dumps({"type": "done", "count": len(ideas)}) + "\n"
+    except Exception as e:
+        logger.exception("배치 분석 중 오류 발생: %s", e)
+        yield json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+
+
+def reporting_pipeline(report):
+    """
+    stream_router 이벤트마다 report 로 중간 결과를 갱신하면서 execute_router 와 같은 형식의 결과를 반환하는 파이프라인.
+    analyze_idea_shared 에 넘겨 비동기 작업도 답변 캐시와 동일 요청 합치기를 거치게 함
+    (다른 요청의 실행에 합류한 작업은 중간 결과 없이 최종 결과만 받음)
+    """
+    def run(text, model_name, api_client, filters=None):
+        partial = {"stage": "router", "routerResponse": None, "chatResponse": None, "patentList": []}
+        ranked = []
+        abstract_parts = []
+        report(partial)
+        for event in stream_router(text, model_name=model_name, api_client=api_client, filters=filters):
+            if event["type"] == "router":
+                partial["routerResponse"] = event["chatResponse"]
+                partial["stage"] = "evaluation" if event["searching"] else "done"
+            elif event["type"] == "evaluation":
+                ranked.append((event["index"], event["metadata"], event["eval_result"]))
+                ranked.sort(key=lambda item: item[0])
+                partial["patentList"] = [build_patent_entry(metadata, eval_result) for _, metadata, eval_result in ranked]
+            elif event["type"] == "abstract":
+                abstract_parts.append(event["delta"])
+                partial["stage"] = "abstract"
+                partial["chatResponse"] = "".join(abstract_parts)
+            elif event["type"] == "done":
+                if event["status"] == "success":
+                    eval_results = [(metadata, eval_result) for _, metadata, eval_result in ranked]
+                    return True, eval_results, "".join(abstract_parts), event["complete"]
+                return False, None, event.get("chatResponse"), False
+            elif event["type"] == "error":
+                return "error", None, event["message"], False
+            report(partial)
+        return "error", None, "pipeline ended without a final event", False
+    return run
+
+
+def run_idea_job(text: str, filters: dict, report) -> dict:
+    """
+    비동기 작업에서 실행되는 분석. process_idea_text 와 같은 답변 캐시/동일 요청 합치기를 거치고,
+    직접 파이프라인을 실행하는 경우 report 로 중간 결과를 갱신. process_idea_text 와 같은 형식의 최종 결과를 반환
+    """
+    response, success_bool = analyze_idea_shared(text, filters, pipeline=reporting_pipeline(report))
+    if success_bool == "error":
+        raise RuntimeError(response["chatResponse"])
+    return response
+
+
 @app.route('/api/analyze-idea', methods=['POST'])
 def analyze_idea():
     """
     Frontend로부터 아이디어 텍스트를 받아 처리하고 결과를 반환하는 API 엔드포인트
+    선택 항목 "filters": {"dateFrom", "dateTo", "applicants", "excludeApplicants"} 로 검색 대상 특허를 제한
+    (/stream, /batch, /api/jobs 도 동일)
     """
     try:
         # Frontend에서 보낸 JSON 데이터를 수신.
@@ -64,19 +289,111 @@ def analyze_idea():
 
         if not idea_text:
             return jsonify({"status": "error", "message": "No 'idea_text' provided."}), 400
+        try:
+            filters = parse_search_filters(data)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
 
         # 텍스트를 처리.
-        response_data = process_idea_text(idea_text)
+        response_data = process_idea_text(idea_text, filters)
 
         # 처리된 결과를 JSON 형태로 Frontend에 반환.
         return jsonify(response_data)
 
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(error_trace)
-        print(f"Error occurred: {e}")
+        logger.exception("Error occurred: %s", e)
         return jsonify({"status": "error", "message": "An internal server error occurred."}), 500
 
+@app.route('/api/analyze-idea/stream', methods=['POST'])
+def analyze_idea_stream():
+    """
+    /api/analyze-idea 의 스트리밍 버전. 파이프라인 단계별 결과를 NDJSON(한 줄에 JSON 하나)으로 전송
+      - router: 라우터 LLM 응답 / patent: 평가가 끝난 특허 (완료 순, rank 는 검색 순위)
+      - abstract: 최종 보고서 마크다운 조각 / done, error: 스트림 종료
+    """
+    data = request.json or {}
+    idea_text = data.get('idea')
+
+    if not idea_text:
+        return jsonify({"status": "error", "message": "No 'idea_text' provided."}), 400
+    try:
+        filters = parse_search_filters(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return Response(
+        stream_with_context(stream_idea_events(idea_text, g.request_id, filters)),
+        mimetype='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/api/analyze-idea/batch', methods=['POST'])
+def analyze_idea_batch():
+    """
+    여러 아이디어를 한 번에 분석. 요청 본문: {"ideas": ["...", ...], "filters": {...}(선택, 모든 아이디어에 적용)}
+    결과는 아이디어 분석이 끝나는 순서대로 NDJSON 으로 전송
+      - idea: {"index": 입력 위치, "result": /api/analyze-idea 와 같은 형식} / done, error: 스트림 종료
+    """
+    data = request.json or {}
+    ideas = data.get('ideas')
+
+    if not isinstance(ideas, list) or not ideas or not all(isinstance(idea, str) and idea.strip() for idea in ideas):
+        return jsonify({"status": "error", "message": "'ideas' must be a non-empty list of idea texts."}), 400
+    if len(ideas) > BATCH_MAX_IDEAS:
+        return jsonify({"status": "error", "message": f"Too many ideas (max {BATCH_MAX_IDEAS})."}), 400
+    try:
+        filters = parse_search_filters(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return Response(
+        stream_with_context(stream_batch_events(ideas, g.request_id, filters)),
+        mimetype='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_idea_job():
+    """
+    아이디어 분석을 비동기 작업으로 등록하고 작업 ID 를 즉시 반환 (202).
+    대기열이 가득 차면 429 를 반환하므로 클라이언트는 Retry-After 이후 다시 시도.
+    """
+    data = request.json or {}
+    idea_text = data.get('idea')
+
+    if not idea_text:
+        return jsonify({"status": "error", "message": "No 'idea_text' provided."}), 400
+    try:
+        filters = parse_search_filters(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        job = job_manager.submit(run_idea_job, idea_text, filters)
+    except QueueFullError:
+        return jsonify({"status": "error", "message": "Too many pending analyses. Please retry later."}), 429, {"Retry-After": "5"}
+
+    return jsonify({"jobId": job.id, "status": job.status, "statusUrl": f"/api/jobs/{job.id}"}), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_idea_job(job_id):
+    """
+    작업 상태 조회: status(queued/running/succeeded/failed), 진행 중이면 partial(중간 결과), 완료 시 result(최종 결과)
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job."}), 404
+    return jsonify(job)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus 텍스트 형식의 지표: 단계별 지연 히스토그램, 단계별 오류, LLM 토큰 사용량, 캐시 적중률, HTTP 요청 수
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     # debug=True: 개발 중에 코드가 변경되면 서버를 자동으로 재시작.
     app.run(debug=True, port=5000)
@@ -0,0 +1,125 @@
+"""
+Chroma(HNSW)와 mmap 양자화 벡터 색인(module.VectorIndex)의 재현율/지연 비교.
+
+합성 컬렉션(benchmarks.fake_embedding)을 만든 뒤 int8/float16, 전수/IVF 색인으로 내보내고,
+같은 쿼리들에 대해 정확한 float32 전수 검색 결과 대비 recall@k 와 쿼리당 지연(p50/p95), 디스크 크기를 측정합니다.
+
+사용 예 (저장소 루트에서):
+    python -m benchmarks.compare_vector_backends --collection-size 20000 --queries 200 --ivf-lists 128 --probes 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_embedding import FakeEmbeddingFunction, build_synthetic_collection, synthetic_idea
+from benchmarks.run_benchmark import describe
+from module.VectorIndex import export_vector_index
+
+
+def directory_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 2**20
+
+
+def exact_top_k(collection, query_vectors, k, page_size=5000):
+    """컬렉션 전체 임베딩(float32)으로 구한 정확한 상위 k 개 청크 id (재현율 기준값)."""
+    ids, embeddings = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        ids.extend(page["ids"])
+        embeddings.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    matrix = np.concatenate(embeddings)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+    scores = queries @ matrix.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return [set(ids[i] for i in row) for row in top]
+
+
+def measure(name, search, query_vectors, truth, k):
+    latencies, recalls = [], []
+    for vector, expected in zip(query_vectors, truth):
+        start = time.perf_counter()
+        found = search(vector)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & set(found[:k])) / len(expected))
+    stats = describe(latencies)
+    return {"backend": name, "recall": float(np.mean(recalls)), "p50_ms": stats["p50_ms"], "p95_ms": stats["p95_ms"]}
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="llm_rag_vector_")
+    embedding_func = FakeEmbeddingFunction()
+    print(f"합성 컬렉션 생성 중: 특허 {args.collection_size}개 x 청크 {args.chunks_per_patent}개 ({workdir})")
+    collection = build_synthetic_collection(os.path.join(workdir, "chroma"), n_patents=args.collection_size,
+                                            chunks_per_patent=args.chunks_per_patent, seed=args.seed)
+
+    rng = np.random.default_rng(args.seed + 1)
+    query_vectors = [np.asarray(v, dtype=np.float32) for v in embedding_func([synthetic_idea(rng) for _ in range(args.queries)])]
+    truth = exact_top_k(collection, query_vectors, args.k)
+
+    rows = [measure(
+        "chroma (hnsw)",
+        lambda vector: collection.query(query_embeddings=[vector.tolist()], n_results=args.k, include=[])["ids"][0],
+        query_vectors, truth, args.k,
+    )]
+    rows[0]["disk_mb"] = directory_size_mb(os.path.join(workdir, "chroma"))
+
+    variants = [("int8", 0), ("float16", 0)]
+    if args.ivf_lists:
+        variants += [("int8", args.ivf_lists), ("float16", args.ivf_lists)]
+    for dtype, ivf_lists in variants:
+        path = os.path.join(workdir, f"index_{dtype}_{ivf_lists}")
+        index = export_vector_index(collection, path, dtype=dtype, ivf_lists=ivf_lists)
+        name = f"mmap {dtype} " + (f"ivf{ivf_lists}/p{args.probes}" if ivf_lists else "brute")
+        row = measure(
+            name,
+            lambda vector: [index.ids[r] for r in index.search([vector], args.k, probes=args.probes)[0][0]],
+            query_vectors, truth, args.k,
+        )
+        row["disk_mb"] = directory_size_mb(path)
+        rows.append(row)
+
+    return {"config": vars(args), "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma 와 mmap 양자화 벡터 색인의 재현율/지연 비교")
+    parser.add_argument("--collection-size", type=int, default=5000, help="합성 특허 수")
+    parser.add_argument("--chunks-per-patent", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--ivf-lists", type=int, default=64, help="0 이면 IVF 비교 생략")
+    parser.add_argument("--probes", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과를 JSON 으로 저장할 경로")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(f"\n{'backend':<26}{'recall@' + str(args.k):>11}{'p50(ms)':>10}{'p95(ms)':>10}{'disk(MB)':>10}")
+    for row in report["results"]:
+        print(f"{row['backend']:<26}{row['recall']:>11.3f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['disk_mb']:>10.1f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+오프라인 벤치마크용 결정적 임베딩 함수와 합성 특허 컬렉션 생성기.
+"""
+import hashlib
+import numpy as np
+import chromadb
+from chromadb import EmbeddingFunction
+
+from module.Rerank import char_ngrams
+from module.Filters import filter_fields
+
+FAKE_EMBEDDING_DIM = 256
+
+# 합성 특허 문서를 만들 때 쓰는 기술 용어
+SYNTHETIC_TERMS = [
+    "유모차", "송풍 장치", "핸들 프레임", "착탈식 결합부", "배터리 모듈", "리튬 이온", "양극 활물질", "전해질",
+    "드론", "프로펠러", "배송 로봇", "자율 주행", "라이다 센서", "카메라 모듈", "영상 처리", "딥러닝 모델",
+    "냉장고", "압축기", "열교환기", "온도 센서", "스마트폰", "디스플레이 패널", "터치 센서", "무선 충전 코일",
+    "모터 구동부", "감속 기어", "브레이크 장치", "서스펜션", "공기 청정 필터", "습도 조절", "전력 변환기", "통신 모듈",
+]
+SYNTHETIC_APPLICANTS = ["삼성전자", "LG전자", "현대자동차", "SK하이닉스", "네이버", "카카오", "개인"]
+
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    """
+    문자 2-gram 을 해시해 고정 차원 벡터로 만드는 결정적 임베딩 함수.
+    실제 의미 임베딩은 아니지만 어휘가 겹치는 문서끼리 가까워지므로 검색 경로를 현실적으로 흉내 냅니다.
+    """
+
+    def __init__(self, dim=FAKE_EMBEDDING_DIM):
+        self.dim = dim
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for gram in char_ngrams(text, 2):
+                digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+    @staticmethod
+    def name():
+        return "fake-bigram-hash"
+
+    def get_config(self):
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config):
+        return FakeEmbeddingFunction(config.get("dim", FAKE_EMBEDDING_DIM))
+
+
+def synthetic_idea(rng):
+    terms = rng.choice(SYNTHETIC_TERMS, size=3, replace=False)
+    return f"{terms[0]}의 성능을 높이기 위해 {terms[1]}에 결합된 {terms[2]}를 구비한 시스템"
+
+
+def build_synthetic_collection(db_path, collection_name="patents", n_patents=2000, chunks_per_patent=3, seed=0, batch_size=1000):
+    """
+    n_patents 개 특허(특허당 chunks_per_patent 개 청크)로 구성된 합성 Chroma 컬렉션을 만듭니다.
+    메타데이터 형식은 실제 적재 파이프라인(module.Ingestion)과 같습니다.
+    """
+    rng = np.random.default_rng(seed)
+    embedding_func = FakeEmbeddingFunction()
+    client = chromadb.PersistentClient(path=db_path)
+    try:
+        client.delete_collection(collection_name)
+    except Exception:
+        pass
+    collection = client.create_collection(collection_name, embedding_function=embedding_func, metadata={"hnsw:space": "cosine"})
+
+    ids, documents, metadatas = [], [], []
+
+    def flush():
+        if ids:
+            collection.add(ids=list(ids), documents=list(documents), metadatas=list(metadatas),
+                           embeddings=[v.tolist() for v in embedding_func(documents)])
+            ids.clear(), documents.clear(), metadatas.clear()
+
+    for p in range(n_patents):
+        app_number = f"10-{2000 + p % 25}-{p:07d}"
+        title_terms = rng.choice(SYNTHETIC_TERMS, size=2, replace=False)
+        metadata = {
+            "ApplicationNumber": app_number,
+            "InventionName": f"{title_terms[0]}를 포함하는 {title_terms[1]}",
+            "ApplicationDate": f"{2000 + p % 25}{1 + p % 12:02d}{1 + p % 28:02d}",
+            "Applicant": SYNTHETIC_APPLICANTS[p % len(SYNTHETIC_APPLICANTS)],
+        }
+        metadata.update(filter_fields(metadata))
+        for c in range(chunks_per_patent):
+            terms = rng.choice(SYNTHETIC_TERMS, size=6)
+            ids.append(f"{app_number}_{c}")
+            documents.append(
+                f"본 발명은 {terms[0]}와 {terms[1]}에 관한 것으로, {terms[2]}에 결합된 {terms[3]}를 통해 "
+                f"{terms[4]}의 효율을 개선한다. 또한 {terms[5]}를 제어하는 방법을 제공한다."
+            )
+            metadatas.append(dict(metadata, ChunkIndex=c))
+        if len(ids) >= batch_size:
+            flush()
+    flush()
+    return collection
@@ -0,0 +1,234 @@
+"""
+Gemini 할당량을 쓰지 않는 오프라인 종단 간 벤치마크.
+
+로컬 스텁 LLM 서버(benchmarks.stub_llm_server)와 결정적 임베딩(benchmarks.fake_embedding)으로
+합성 Chroma 컬렉션을 만든 뒤, Flask 앱의 /api/analyze-idea 에 동시 요청을 보내
+단계별(router, retrieval, embedding, vector_query, evaluation, abstract) p50/p95/p99 지연,
+처리량, 메모리 사용량을 측정합니다.
+
+사용 예 (저장소 루트에서):
+    python -m benchmarks.run_benchmark --collection-size 5000 --requests 40 --concurrency 8 --latency-ms 300
+    python -m benchmarks.run_benchmark --eval-batch-size 5 --output bench_output.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import threading
+import functools
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stub_llm_server import StubLLMServer, StubConfig
+from benchmarks.fake_embedding import FakeEmbeddingFunction, build_synthetic_collection, synthetic_idea
+
+
+class StageTimer:
+    """단계 이름별 소요 시간(초)을 스레드 안전하게 모읍니다."""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, elapsed):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(elapsed)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        return {stage: describe(values) for stage, values in samples.items()}
+
+
+def describe(values):
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def instrument(timer):
+    """파이프라인 각 단계 함수를 타이머로 감쌉니다. 모두 호출 시점에 모듈 전역을 찾으므로 교체가 반영됩니다."""
+    from module import Generator, Retrieval
+
+    Generator.route_idea = timer.wrap("router", Generator.route_idea)
+    Generator.TOOL_MAPPING["search_query"] = timer.wrap("retrieval", Generator.TOOL_MAPPING["search_query"])
+    Generator.evaluation_idea = timer.wrap("evaluation", Generator.evaluation_idea)
+    Generator.evaluation_batch = timer.wrap("evaluation_batch", Generator.evaluation_batch)
+    Generator.abstract_result = timer.wrap("abstract", Generator.abstract_result)
+    Retrieval.PatentRetriever.embed_query = timer.wrap("embedding", Retrieval.PatentRetriever.embed_query)
+    Retrieval.PatentRetriever.query = timer.wrap("vector_query", Retrieval.PatentRetriever.query)
+    Retrieval.PatentRetriever.embed_queries = timer.wrap("embedding_batch", Retrieval.PatentRetriever.embed_queries)
+    Retrieval.PatentRetriever.query_many = timer.wrap("vector_query_batch", Retrieval.PatentRetriever.query_many)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="llm_rag_bench_")
+    # 캐시, Chroma DB, BM25 역색인 등 상대 경로 기본값이 모두 임시 디렉터리에 생기도록 이동
+    os.chdir(workdir)
+
+    stub = StubLLMServer(StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        batch_drop_rate=args.batch_drop_rate,
+        seed=args.seed,
+    )).start()
+    os.environ["LLM_BASE_URL"] = stub.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "stub-key")
+
+    from module import Generator, Retrieval
+    from module.Lexical import build_lexical_index
+
+    print(f"합성 컬렉션 생성 중: 특허 {args.collection_size}개 x 청크 {args.chunks_per_patent}개 ({workdir})")
+    start = time.perf_counter()
+    collection = build_synthetic_collection(
+        Retrieval.DEFAULT_DB_PATH, n_patents=args.collection_size, chunks_per_patent=args.chunks_per_patent, seed=args.seed
+    )
+    if args.hybrid:
+        build_lexical_index(collection)
+    print(f"컬렉션 준비 완료: {time.perf_counter() - start:.1f}s")
+
+    Generator.EVAL_BATCH_SIZE = args.eval_batch_size
+    Generator.EVAL_MAX_WORKERS = args.eval_workers
+    Generator.EVAL_CACHE_ENABLED = not args.no_cache
+    Generator.RERANK_ENABLED = not args.no_rerank
+    Retrieval.HYBRID_SEARCH_ENABLED = args.hybrid
+    retriever = Retrieval.get_retriever(embedding_function=FakeEmbeddingFunction())
+    if args.no_cache:
+        retriever.embedding_cache = None
+
+    timer = StageTimer()
+    instrument(timer)
+
+    import app as flask_app
+    client_app = flask_app.app
+    if args.no_cache:
+        flask_app.ANSWER_CACHE_ENABLED = False
+
+    rng = np.random.default_rng(args.seed)
+    distinct = max(1, int(args.requests * (1 - args.repeat_ratio)))
+    pool = [synthetic_idea(rng) for _ in range(distinct)]
+    ideas = [pool[i % distinct] for i in range(args.requests)]
+
+    def send(idea):
+        client = client_app.test_client()
+        start = time.perf_counter()
+        response = client.post("/api/analyze-idea", json={"idea": idea})
+        elapsed = time.perf_counter() - start
+        payload = response.get_json(silent=True) or {}
+        timer.record("end_to_end", elapsed)
+        return response.status_code, payload.get("status"), len(payload.get("patentList") or [])
+
+    for idea in ideas[:args.warmup]:
+        send(idea)
+    timer.reset()
+    stub.stats.update(requests=0, errors=0)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(send, ideas))
+    wall = time.perf_counter() - start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stub.stop()
+
+    statuses = {}
+    for http_status, status, _ in outcomes:
+        key = f"{http_status}/{status}"
+        statuses[key] = statuses.get(key, 0) + 1
+
+    report = {
+        "config": vars(args),
+        "requests": len(ideas),
+        "wall_seconds": wall,
+        "throughput_rps": len(ideas) / wall if wall else 0.0,
+        "statuses": statuses,
+        "mean_patents_per_response": float(np.mean([n for _, _, n in outcomes])) if outcomes else 0.0,
+        "llm_calls": stub.stats["requests"],
+        "llm_errors": stub.stats["errors"],
+        "stages": timer.summary(),
+        "memory": {
+            "traced_peak_mb": peak_traced / 2**20,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+    }
+    return report
+
+
+def print_report(report):
+    print("\n=== 벤치마크 결과 ===")
+    print(f"요청 {report['requests']}건 / {report['wall_seconds']:.2f}s -> {report['throughput_rps']:.2f} req/s")
+    print(f"응답 상태: {report['statuses']}, 평균 특허 수: {report['mean_patents_per_response']:.1f}")
+    print(f"LLM 호출 {report['llm_calls']}회 (스텁 오류 {report['llm_errors']}회)")
+    print(f"메모리: tracemalloc 최고 {report['memory']['traced_peak_mb']:.1f}MB, RSS 최대 {report['memory']['max_rss_mb']:.1f}MB")
+    print(f"\n{'stage':<18}{'count':>7}{'p50(ms)':>11}{'p95(ms)':>11}{'p99(ms)':>11}{'max(ms)':>11}")
+    for stage, stats in sorted(report["stages"].items()):
+        if not stats.get("count"):
+            continue
+        print(f"{stage:<18}{stats['count']:>7}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}{stats['max_ms']:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM_RAG 오프라인 종단 간 벤치마크")
+    parser.add_argument("--collection-size", type=int, default=2000, help="합성 특허 수")
+    parser.add_argument("--chunks-per-patent", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1, help="측정에서 제외할 워밍업 요청 수")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="반복되는 아이디어 비율 (캐시 효과 측정)")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="스텁 LLM 평균 지연")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--batch-drop-rate", type=float, default=0.0)
+    parser.add_argument("--eval-batch-size", type=int, default=1)
+    parser.add_argument("--eval-workers", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true", help="임베딩/평가 결과/답변 캐시 비활성화")
+    parser.add_argument("--no-rerank", action="store_true", help="LLM 평가 전 후보 선별 비활성화")
+    parser.add_argument("--hybrid", action="store_true", help="BM25 역색인을 만들어 하이브리드 검색 사용")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과를 JSON 으로 저장할 경로 (실행 간 비교용)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args)
+    print_report(report)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n결과 저장: {output}")
+
+
+if __name__ == "__main__":
+    main()
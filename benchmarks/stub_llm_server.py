@@ -0,0 +1,229 @@
+"""
+Gemini OpenAI 호환 엔드포인트(/v1beta/openai/chat/completions)를 흉내 내는 로컬 스텁 서버.
+
+요청에 포함된 도구 이름을 보고 파이프라인 단계별로 그럴듯한 응답을 돌려줍니다.
+  - search_query        : 라우터 -> 사용자 입력을 그대로 query_text 로 하는 도구 호출
+  - cal_evalscore       : 평가자 -> 결정적인 점수와 근거
+  - cal_batch_evalscore : 배치 평가자 -> 조각 수만큼의 결과 배열
+  - 도구 없음           : 요약기 -> 마크다운 보고서 (stream=True 이면 SSE 로 전송)
+
+지연 시간(평균 + 지터), 오류율(429/500), 응답 내용은 StubConfig 로 조절합니다.
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 800.0       # 호출당 평균 지연
+    jitter_ms: float = 200.0        # 지연의 균등 분포 폭 (±)
+    error_rate: float = 0.0         # 오류 응답 비율 (0~1)
+    rate_limit_share: float = 0.5   # 오류 중 429 비율 (나머지는 500)
+    router_search_rate: float = 1.0 # 라우터가 검색 도구를 호출하는 비율
+    batch_drop_rate: float = 0.0    # 배치 평가 결과에서 항목을 빠뜨릴 확률 (폴백 경로 측정용)
+    stream_chunks: int = 20         # 요약기 스트리밍 시 조각 수
+    seed: int = 0
+
+
+def _stable_score(text):
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % 101
+
+
+def _tool_call(name, arguments):
+    return {
+        "id": f"call_{hashlib.md5(json.dumps(arguments).encode()).hexdigest()[:12]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)},
+    }
+
+
+def _completion(model, content=None, tool_calls=None, prompt_tokens=0, completion_tokens=0):
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+            "message": {"role": "assistant", "content": content, "tool_calls": tool_calls},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class StubLLMServer:
+    """백그라운드 스레드에서 동작하는 스텁 서버. base_url 을 OpenAI 클라이언트에 넘겨 사용합니다."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1beta/openai/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _uniform(self):
+        with self._random_lock:
+            return self._random.random()
+
+    def _respond(self, request):
+        """요청 본문을 보고 응답 dict (스트리밍 요청이면 SSE 이벤트 리스트)를 만듭니다."""
+        config = self.config
+        model = request.get("model", "stub")
+        messages = request.get("messages", [])
+        user_text = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 2
+        tool_names = [tool["function"]["name"] for tool in request.get("tools") or []]
+
+        if "search_query" in tool_names:
+            if self._uniform() >= config.router_search_rate:
+                return _completion(model, content="아이디어가 너무 광범위합니다. 해결하려는 문제를 알려주세요.",
+                                   prompt_tokens=prompt_tokens, completion_tokens=30)
+            call = _tool_call("search_query", {"query_text": user_text})
+            return _completion(model, content="좋은 아이디어입니다. 유사 특허를 검색하겠습니다.",
+                               tool_calls=[call], prompt_tokens=prompt_tokens, completion_tokens=40)
+
+        if "cal_batch_evalscore" in tool_names:
+            n_chunks = user_text.count("[특허 문서 조각 #")
+            results = [
+                {"index": i + 1, "eval_score": _stable_score(f"{user_text}{i}"), "reason": f"스텁 배치 평가 #{i + 1}"}
+                for i in range(n_chunks)
+                if self._uniform() >= config.batch_drop_rate
+            ]
+            call = _tool_call("cal_batch_evalscore", {"results": results})
+            return _completion(model, tool_calls=[call], prompt_tokens=prompt_tokens, completion_tokens=60 * n_chunks)
+
+        if "cal_evalscore" in tool_names:
+            call = _tool_call("cal_evalscore", {"eval_score": _stable_score(user_text), "reason": "스텁 평가: 핵심 구성이 부분적으로 유사합니다."})
+            return _completion(model, tool_calls=[call], prompt_tokens=prompt_tokens, completion_tokens=60)
+
+        report = "## 1. 종합 검토 의견\n스텁 보고서입니다.\n\n## 2. 기술적 제언\n회피 설계를 검토하세요.\n"
+        if request.get("stream"):
+            size = -(-len(report) // config.stream_chunks)
+            pieces = [report[start:start + size] for start in range(0, len(report), size)]
+            events = []
+            for i, piece in enumerate(pieces):
+                events.append({
+                    "id": "chatcmpl-stub-stream",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece},
+                                 "finish_reason": "stop" if i == len(pieces) - 1 else None}],
+                })
+            if (request.get("stream_options") or {}).get("include_usage"):
+                # OpenAI 형식: 마지막에 choices 가 비어 있는 usage 청크를 보냄
+                events.append({
+                    "id": "chatcmpl-stub-stream",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(report) // 2,
+                              "total_tokens": prompt_tokens + len(report) // 2},
+                })
+            return events
+        return _completion(model, content=report, prompt_tokens=prompt_tokens, completion_tokens=len(report) // 2)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                config = stub.config
+                with stub._stats_lock:
+                    stub.stats["requests"] += 1
+
+                delay = max(0.0, config.latency_ms + (stub._uniform() * 2 - 1) * config.jitter_ms) / 1000
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+                if stub._uniform() < config.error_rate:
+                    with stub._stats_lock:
+                        stub.stats["errors"] += 1
+                    time.sleep(delay / 4)
+                    status = 429 if stub._uniform() < config.rate_limit_share else 500
+                    return self._send_json(status, {"error": {"message": "stub error", "code": status}})
+
+                payload = stub._respond(request)
+                if isinstance(payload, dict):
+                    time.sleep(delay)
+                    return self._send_json(200, payload)
+
+                # SSE 스트리밍 응답: 지연의 절반은 첫 토큰 전, 나머지는 조각 사이에 분산
+                time.sleep(delay / 2)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event in payload:
+                    self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(delay / (2 * len(payload)))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI 호환 스텁 LLM 서버")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubLLMServer(StubConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate), port=args.port)
+    print(f"스텁 서버 실행 중: {server.base_url}")
+    server._server.serve_forever()
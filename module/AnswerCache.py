@@ -0,0 +1,101 @@
+import time
+import threading
+
+import numpy as np
+
+from .Metrics import logger, record_cache
+
+# 의미 기반 답변 캐시 설정
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_THRESHOLD = 0.95        # 이 이상 코사인 유사도인 이전 아이디어의 분석 결과를 재사용
+ANSWER_CACHE_MAX_ENTRIES = 2000      # 보관할 최대 답변 수 (가득 차면 가장 오래 쓰이지 않은 항목부터 교체)
+ANSWER_CACHE_TTL = 24 * 60 * 60      # 답변 유효 기간(초)
+
+
+class SemanticAnswerCache:
+    """
+    아이디어 임베딩으로 찾는 전체 분석 결과 캐시.
+
+    답변마다 정규화된 임베딩을 고정 크기 행렬의 한 행에 저장하고, 조회 시 행렬 곱 한 번으로 가장 비슷한
+    이전 아이디어를 찾습니다. namespace(예: 모델 이름)가 같은 항목끼리만 비교합니다.
+    fingerprint(컬렉션 재구축 여부를 나타내는 값)가 바뀌면 저장된 답변을 모두 버립니다.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._matrix = None
+        self._namespaces = np.empty(max_entries, dtype=object)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._values = [None] * max_entries
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            if self._valid.any():
+                logger.info("[답변 캐시] 특허 컬렉션이 바뀌어 저장된 답변 %d개를 비웁니다.", int(self._valid.sum()))
+            self._valid[:] = False
+            self._values = [None] * self.max_entries
+            self._fingerprint = fingerprint
+
+    def lookup(self, vector, namespace, fingerprint=None):
+        """유사도가 threshold 이상인 가장 가까운 답변을 반환합니다. 없으면 None."""
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if self._matrix is None or not self._valid.any():
+                record_cache("semantic_answer", False)
+                return None
+
+            now = time.time()
+            self._valid &= now - self._created <= self.ttl
+            candidates = np.flatnonzero(self._valid & (self._namespaces == namespace))
+            if not len(candidates):
+                record_cache("semantic_answer", False)
+                return None
+
+            similarities = self._matrix[candidates] @ self._normalize(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                record_cache("semantic_answer", False)
+                return None
+
+            slot = candidates[best]
+            self._last_used[slot] = now
+            record_cache("semantic_answer", True)
+            logger.info("[답변 캐시] 유사도 %.3f 인 이전 분석 결과를 재사용합니다.", similarities[best])
+            return self._values[slot]
+
+    def store(self, vector, namespace, value, fingerprint=None):
+        vector = self._normalize(vector)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if self._matrix is None or self._matrix.shape[1] != len(vector):
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._valid[:] = False
+
+            free = np.flatnonzero(~self._valid)
+            slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+            now = time.time()
+            self._matrix[slot] = vector
+            self._namespaces[slot] = namespace
+            self._created[slot] = self._last_used[slot] = now
+            self._values[slot] = value
+            self._valid[slot] = True
+
+    def clear(self):
+        with self._lock:
+            self._valid[:] = False
+            self._values = [None] * self.max_entries
+
+    def __len__(self):
+        with self._lock:
+            return int(self._valid.sum())
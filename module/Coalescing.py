@@ -0,0 +1,87 @@
+import time
+import threading
+from collections import OrderedDict
+
+from .Metrics import logger, metrics
+
+# 동일 요청 합치기(single-flight) 설정
+COALESCE_RESULT_TTL = 30.0    # 완료된 결과를 재사용할 시간(초). 0 이면 진행 중인 요청만 합침
+COALESCE_MAX_RESULTS = 256    # 보관할 최근 결과 수
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    같은 키로 동시에 들어온 호출을 하나의 실행으로 합칩니다.
+
+    첫 호출만 실제로 func 를 실행하고, 실행 중에 같은 키로 들어온 호출은 그 결과(또는 예외)를 함께 받습니다.
+    result_ttl 이 0 보다 크면 cacheable(result) 가 True 인 결과를 잠시 보관해, 직후에 도착한 같은 요청에도 재사용합니다.
+    """
+
+    def __init__(self, name, result_ttl=COALESCE_RESULT_TTL, max_results=COALESCE_MAX_RESULTS):
+        self.name = name
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = OrderedDict()
+
+    def do(self, key, func, *args, cacheable=None, **kwargs):
+        """반환값: (결과, shared). shared 는 다른 호출의 실행 결과나 보관된 결과를 재사용했는지 여부입니다."""
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                if time.time() - cached[1] <= self.result_ttl:
+                    self._results.move_to_end(key)
+                    self._count("result_cache")
+                    return cached[0], True
+                del self._results[key]
+
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            self._count("coalesced")
+            logger.info("[%s] 진행 중인 동일 요청에 합류합니다.", self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        self._count("executed")
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.result_ttl > 0 and (cacheable is None or cacheable(call.result)):
+                    self._results[key] = (call.result, time.time())
+                    while len(self._results) > self.max_results:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.result, False
+
+    def invalidate(self, key=None):
+        """보관된 결과를 지웁니다. key 가 None 이면 전부 지웁니다."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def _count(self, outcome):
+        metrics.inc("llm_rag_singleflight_total", {"name": self.name, "outcome": outcome},
+                    help_text="Single-flight calls by outcome (executed, coalesced, result_cache).")
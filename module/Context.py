@@ -0,0 +1,120 @@
+import re
+import math
+
+from .Rerank import lexical_overlap
+from .Metrics import metrics
+
+# 프롬프트에 넣을 문맥의 토큰 예산 (근사치 기준)
+EVAL_CHUNK_TOKEN_BUDGET = 600         # 평가 호출 1회에 넣을 특허 청크 하나의 최대 토큰 수
+ABSTRACT_INPUT_TOKEN_BUDGET = 4000    # 요약기에 넣을 평가 정보 전체의 최대 토큰 수
+ABSTRACT_REASON_TOKEN_BUDGET = 300    # 요약기에 넣을 특허 하나의 평가 사유 최대 토큰 수
+
+# 토큰 수 근사 계수: 한글/한자는 글자당 약 1토큰, 그 외 문자는 약 4글자당 1토큰
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_CHARS_PER_TOKEN = 4.0
+
+ELLIPSIS = " … "
+
+_CJK = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3\u4e00-\u9fff]")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?다])\s+|\n+")
+
+
+def estimate_tokens(text):
+    """토크나이저 없이 쓰는 토큰 수 근사치."""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(text) - cjk - sum(1 for ch in text if ch.isspace())
+    return math.ceil(cjk * CJK_TOKENS_PER_CHAR + max(other, 0) / OTHER_CHARS_PER_TOKEN)
+
+
+def truncate_to_budget(text, budget):
+    """text 를 앞에서부터 budget 토큰 이하로 자릅니다."""
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "…"
+
+
+def _record_trim(stage, before, after):
+    if after < before:
+        metrics.inc("llm_rag_context_tokens_trimmed_total", {"stage": stage}, before - after,
+                    help_text="Estimated prompt tokens removed by context packing.")
+
+
+def compress_chunk(query_text, text, budget=None, stage="evaluation"):
+    """
+    특허 청크가 budget 토큰을 넘으면 쿼리와 어휘가 가장 많이 겹치는 문장만 골라 예산 안으로 줄입니다.
+
+    고른 문장은 원래 순서대로 이어 붙이고, 빠진 부분은 "…" 로 표시합니다.
+    어떤 문장도 들어가지 않으면 가장 관련 있는 문장을 잘라서 사용합니다.
+    budget 을 생략하면 EVAL_CHUNK_TOKEN_BUDGET 을 따릅니다.
+    """
+    budget = EVAL_CHUNK_TOKEN_BUDGET if budget is None else budget
+    text = text or ""
+    total = estimate_tokens(text)
+    if total <= budget:
+        return text
+
+    sentences = [sentence for sentence in _SENTENCE_BOUNDARY.split(text) if sentence and sentence.strip()]
+    costs = [estimate_tokens(sentence) for sentence in sentences]
+    ranked = sorted(range(len(sentences)), key=lambda i: (-lexical_overlap(query_text, sentences[i]), i))
+
+    chosen, used = set(), 0
+    separator = estimate_tokens(ELLIPSIS)
+    for i in ranked:
+        if used + costs[i] + separator <= budget:
+            chosen.add(i)
+            used += costs[i] + separator
+
+    if not chosen:
+        packed = truncate_to_budget(sentences[ranked[0]] if sentences else text, budget)
+    else:
+        parts = []
+        for i in range(len(sentences)):
+            if i in chosen:
+                parts.append(sentences[i].strip())
+            elif parts and parts[-1] != ELLIPSIS.strip():
+                parts.append(ELLIPSIS.strip())
+        packed = " ".join(parts)
+
+    _record_trim(stage, total, estimate_tokens(packed))
+    return packed
+
+
+def pack_evaluations(eval_results, budget=None, item_budget=None):
+    """
+    요약기에 넣을 평가 결과를 점수 내림차순으로 고르고, 전체 토큰 수가 budget 을 넘지 않게 자릅니다.
+
+    각 평가 사유는 item_budget 토큰 이하로 자르며, 예산을 넘는 낮은 점수의 특허는 제외합니다.
+    반환값: [(patent_metadata, [eval_score, reason]), ...] (점수 내림차순)
+    budget / item_budget 을 생략하면 ABSTRACT_INPUT_TOKEN_BUDGET / ABSTRACT_REASON_TOKEN_BUDGET 을 따릅니다.
+    """
+    budget = ABSTRACT_INPUT_TOKEN_BUDGET if budget is None else budget
+    item_budget = ABSTRACT_REASON_TOKEN_BUDGET if item_budget is None else item_budget
+
+    def score(item):
+        try:
+            return float(item[1][0])
+        except (TypeError, ValueError):
+            return 0.0
+
+    packed, used, total = [], 0, 0
+    for metadata, eval_result in sorted(eval_results, key=score, reverse=True):
+        reason = eval_result[1] or ""
+        total += estimate_tokens(reason) + estimate_tokens(metadata.get('InventionName'))
+        reason = truncate_to_budget(reason, item_budget)
+        cost = estimate_tokens(reason) + estimate_tokens(metadata.get('InventionName'))
+        if packed and used + cost > budget:
+            continue
+        packed.append((metadata, [eval_result[0], reason]))
+        used += cost
+
+    _record_trim("abstract", total, used)
+    return packed
@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from .LLMClient import RateLimitedLLMClient
+from .Metrics import bind_context
+
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+
+# 배치 임베딩 호출 설정
+EMBED_API_BATCH_SIZE = 100          # 배치 요청(batchEmbedContents) 한 번에 보낼 최대 텍스트 수 (API 상한)
+EMBED_REQUESTS_PER_MINUTE = 600     # 배치 요청 기준 토큰 버킷 보충 속도 (분당 요청 수)
+EMBED_BURST = 8                     # 토큰 버킷 용량
+EMBED_MAX_CONCURRENCY = 4           # 동시에 보낼 배치 요청 수 (429 가 나면 자동으로 줄어듦)
+EMBED_CALL_DEADLINE = 300.0         # 재시도와 대기를 포함한 배치 요청 하나의 시간 제한(초)
+
+
+class BatchEmbeddingFunction(embedding_functions.GoogleGenerativeAiEmbeddingFunction):
+    """
+    GoogleGenerativeAiEmbeddingFunction 과 같은 모델/task_type 으로 임베딩하되,
+    텍스트마다 embed_content 를 한 번씩 부르는 대신 batch_size 개씩 묶어 배치 요청 한 번으로 보냅니다.
+
+    배치 요청은 module.LLMClient 의 호출 계층을 거쳐 토큰 버킷 대기와 429/5xx 백오프 재시도를 받고,
+    여러 배치는 max_concurrency 개까지 동시에 보냅니다.
+    컬렉션 설정(name, get_config)은 상속하므로 기존 컬렉션과 임베딩 공간이 그대로 호환됩니다.
+    """
+
+    def __init__(self, api_key=GOOGLE_API_KEY, model_name="models/embedding-001", task_type="RETRIEVAL_DOCUMENT",
+                 batch_size=None, max_concurrency=None, requests_per_minute=None):
+        super().__init__(api_key=api_key, model_name=model_name, task_type=task_type)
+        self.batch_size = min(EMBED_API_BATCH_SIZE, batch_size or EMBED_API_BATCH_SIZE)
+        self.max_concurrency = EMBED_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.limiter = RateLimitedLLMClient(
+            None,
+            requests_per_minute=EMBED_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute,
+            burst=EMBED_BURST,
+            max_concurrency=self.max_concurrency,
+            deadline=EMBED_CALL_DEADLINE,
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.max_concurrency), thread_name_prefix="embed")
+
+    def embed_batch(self, texts):
+        """텍스트 목록(batch_size 이하)을 배치 요청 한 번으로 임베딩합니다."""
+        def request(timeout):
+            return self._genai.embed_content(
+                model=self.model_name,
+                content=list(texts),
+                task_type=self.task_type,
+                request_options={"timeout": timeout},
+            )
+
+        result = self.limiter.call(request)
+        return [np.asarray(vector, dtype=np.float32) for vector in result["embedding"]]
+
+    def __call__(self, input):
+        texts = list(input)
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self.embed_batch(batches[0]) if batches else []
+
+        vectors = []
+        for embedded in self._pool.map(bind_context(self.embed_batch), batches):
+            vectors.extend(embedded)
+        return vectors
@@ -0,0 +1,139 @@
+import re
+import unicodedata
+
+import numpy as np
+
+# 검색 필터용 정규화 메타데이터 필드 (적재 시 원본 필드에서 계산해 함께 저장)
+DATE_FIELD = "ApplicationDateInt"    # 출원일 YYYYMMDD 정수 (알 수 없으면 0)
+APPLICANT_FIELD = "ApplicantId"      # 대표 출원인의 정규화된 식별자 (알 수 없으면 "")
+
+_APPLICANT_SEPARATORS = re.compile(r"[|;\n]")
+_CORPORATE_MARKERS = re.compile(
+    r"주식회사|유한회사|유한책임회사|재단법인|사단법인|\(주\)|\(유\)|\(재\)|\(사\)"
+    r"|\bco\b\.?,?\s*\bltd\b\.?|\binc\b\.?|\bcorp\b\.?|\bcorporation\b|\bltd\b\.?|\blimited\b|\bllc\b|\bgmbh\b|\bcompany\b"
+)
+_NON_WORD = re.compile(r"[^\w]|_")
+
+
+def normalize_date(value, end=False):
+    """
+    "2010.03.27", "2010-3-27", "20100327", "2010-03", "2010" 같은 날짜를 YYYYMMDD 정수로 바꿉니다.
+    월/일이 없으면 end=False 는 가장 이른 날, end=True 는 가장 늦은 날로 채웁니다. 해석할 수 없으면 None.
+    """
+    parts = re.findall(r"\d+", str(value or ""))
+    if len(parts) == 1 and len(parts[0]) in (6, 8):
+        digits = parts[0]
+        parts = [digits[:4], digits[4:6]] + ([digits[6:8]] if len(digits) == 8 else [])
+    if not parts or len(parts[0]) != 4:
+        return None
+
+    year = int(parts[0])
+    month = int(parts[1]) if len(parts) > 1 else (12 if end else 1)
+    day = int(parts[2]) if len(parts) > 2 else (31 if end else 1)
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return year * 10000 + month * 100 + day
+
+
+def canonical_applicant(name):
+    """
+    출원인 이름을 비교용 식별자로 정규화합니다.
+    여러 출원인이 |, ; 로 이어져 있으면 첫 번째(대표) 출원인만 사용하고, 법인 형태 표기와 공백/기호를 제거합니다.
+    예: "삼성전자 주식회사", "삼성전자(주)", "㈜삼성전자" -> "삼성전자"
+    """
+    text = unicodedata.normalize("NFKC", name or "").lower()
+    text = _APPLICANT_SEPARATORS.split(text)[0]
+    text = _CORPORATE_MARKERS.sub(" ", text)
+    return _NON_WORD.sub("", text)
+
+
+def filter_fields(metadata):
+    """원본 메타데이터(ApplicationDate, Applicant)에서 검색 필터용 정규화 필드를 계산합니다."""
+    return {
+        DATE_FIELD: normalize_date(metadata.get("ApplicationDate")) or 0,
+        APPLICANT_FIELD: canonical_applicant(metadata.get("Applicant")),
+    }
+
+
+def _as_list(values):
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    return sorted({applicant for applicant in (canonical_applicant(value) for value in values) if applicant})
+
+
+class SearchFilter:
+    """
+    출원일 범위와 출원인 포함/제외 조건.
+
+    Chroma 에는 where 절로, BM25 역색인과 mmap 벡터 색인에는 행 마스크로 내려보내 검색 단계에서 바로 적용합니다.
+    날짜는 normalize_date 로, 출원인은 canonical_applicant 로 정규화해 비교합니다.
+    """
+
+    def __init__(self, date_from=None, date_to=None, applicants=None, exclude_applicants=None):
+        self.date_from = normalize_date(date_from) if date_from else None
+        self.date_to = normalize_date(date_to, end=True) if date_to else None
+        self.applicants = _as_list(applicants)
+        self.exclude_applicants = _as_list(exclude_applicants)
+
+    def __bool__(self):
+        return bool(self.date_from or self.date_to or self.applicants or self.exclude_applicants)
+
+    def __repr__(self):
+        return f"SearchFilter({self.to_dict()})"
+
+    def to_dict(self):
+        return {
+            "date_from": self.date_from,
+            "date_to": self.date_to,
+            "applicants": self.applicants,
+            "exclude_applicants": self.exclude_applicants,
+        }
+
+    def where(self):
+        """Chroma where 절. 조건이 없으면 None. 날짜 조건이 있으면 출원일을 알 수 없는(0) 특허는 제외합니다."""
+        clauses = []
+        if self.date_from:
+            clauses.append({DATE_FIELD: {"$gte": self.date_from}})
+        elif self.date_to:
+            clauses.append({DATE_FIELD: {"$gt": 0}})
+        if self.date_to:
+            clauses.append({DATE_FIELD: {"$lte": self.date_to}})
+        if self.applicants:
+            clauses.append({APPLICANT_FIELD: {"$in": self.applicants}})
+        if self.exclude_applicants:
+            clauses.append({APPLICANT_FIELD: {"$nin": self.exclude_applicants}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def matches(self, metadata):
+        """메타데이터 하나가 조건을 만족하는지 확인합니다. 정규화 필드가 없으면 원본 필드에서 계산합니다."""
+        metadata = metadata or {}
+        if DATE_FIELD not in metadata or APPLICANT_FIELD not in metadata:
+            metadata = dict(metadata, **filter_fields(metadata))
+        date = metadata[DATE_FIELD]
+        applicant = metadata[APPLICANT_FIELD]
+        return ((not self.date_from or date >= self.date_from)
+                and (not self.date_to or 0 < date <= self.date_to)
+                and (not self.applicants or applicant in self.applicants)
+                and applicant not in self.exclude_applicants)
+
+    def mask(self, dates, applicant_codes, applicant_vocab):
+        """
+        행별 출원일 배열과 출원인 코드 배열(applicant_vocab 의 위치)로 조건을 만족하는 행의 bool 마스크를 만듭니다.
+        where() 와 마찬가지로 날짜 조건이 있으면 출원일이 0(알 수 없음)인 행은 제외합니다.
+        """
+        mask = np.ones(len(dates), dtype=bool)
+        if self.date_from:
+            mask &= dates >= self.date_from
+        if self.date_to:
+            mask &= (dates > 0) & (dates <= self.date_to)
+        if self.applicants:
+            allowed = [code for code, applicant in enumerate(applicant_vocab) if applicant in self.applicants]
+            mask &= np.isin(applicant_codes, allowed)
+        if self.exclude_applicants:
+            excluded = [code for code, applicant in enumerate(applicant_vocab) if applicant in self.exclude_applicants]
+            mask &= ~np.isin(applicant_codes, excluded)
+        return mask
@@ -1,7 +1,29 @@
-from .Retrieval import search_query
+from .Retrieval import search_query, search_queries, normalize_query_text
+from .Rerank import prune_candidates, RERANK_ENABLED
+from .Context import compress_chunk, pack_evaluations, EVAL_CHUNK_TOKEN_BUDGET
+from .Metrics import logger, span, log_payload, record_usage, record_cache, record_error, bind_context
 import json, requests
 from openai import OpenAI
-import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import time
+import hashlib
+import sqlite3
+import threading
+
+# 특허 청크 평가를 동시에 수행할 최대 스레드 수
+EVAL_MAX_WORKERS = 8
+
+# 한 번의 LLM 호출로 평가할 청크 수 (1 이면 청크별 개별 호출)
+EVAL_BATCH_SIZE = 1
+
+# 배치 분석 설정
+BATCH_MAX_WORKERS = 16       # 배치 전체가 나눠 쓰는 LLM 동시 호출 수 (라우터, 평가, 요약)
+BATCH_IDEAS_IN_FLIGHT = 8    # 평가/요약 단계를 동시에 진행할 아이디어 수
+
+# 평가 결과 캐시 설정
+EVAL_CACHE_ENABLED = True
+EVAL_CACHE_PATH = "./eval_cache.sqlite3"
+EVAL_CACHE_TTL = 7 * 24 * 60 * 60  # 캐시 항목 유효 기간(초)
 
 ## 라우터 llm 시스템 프롬프트
 ROUTER_SYSTEM_PROMPT = """
@@ -81,6 +103,16 @@ EVALUATION_SYSTEM_PROMPT = """
 이제 [사용자 아이디어]와 [특허 문서 조각]을 비교 분석하여, **유사성을 중심으로** 평가하고 `cal_evalscore` 함수를 호출하세요.
 """
 
+# 배치 평가 모드에서 평가자 시스템 프롬프트 뒤에 덧붙이는 지침
+BATCH_EVALUATION_INSTRUCTION = """
+---
+### 📦 배치 평가 모드
+
+이번 요청에는 [특허 문서 조각]이 여러 개 주어지며, 각 조각 앞에는 `[특허 문서 조각 #번호]` 형태의 번호가 붙어 있습니다.
+위의 평가 지침을 **각 조각마다 독립적으로** 적용하되, `cal_evalscore` 대신 `cal_batch_evalscore` 함수를 **한 번만** 호출하십시오.
+`results` 배열에는 주어진 모든 조각에 대해 빠짐없이 `index`(조각 번호), `eval_score`, `reason` 을 담아야 합니다.
+"""
+
 ABSTRACTOR_SYSTEM_PROMPT = """
 # Role Definition
 당신은 숙련된 특허 변리사이자 R&D 기술 컨설턴트입니다. 당신의 임무는 사용자의 아이디어와 이를 기반으로 검색된 '유사 특허 리스트'를 종합적으로 분석하여, 사용자에게 통찰력 있는 최종 보고서를 제공하는 것입니다.
@@ -125,6 +157,24 @@ SEARCH_TOOLS = [
                     "query_text": {
                         "type": "string",
                         "description": "RAG 검색을 위한 기술적 서술문입니다. 단순 키워드 나열(예: 'A B C')을 절대 금지합니다. 대신 'A의 기능을 수행하기 위해 B에 결합된 C 장치'와 같이 구성 요소 간의 관계와 목적이 명확한 문장 형태(특허 명칭 스타일)로 입력해야 합니다."
+                    },
+                    "date_from": {
+                        "type": "string",
+                        "description": "사용자가 특정 시점 이후의 특허만 원한다고 명시한 경우에만 지정하는 출원일 하한입니다. 'YYYY' 또는 'YYYY-MM-DD' 형식."
+                    },
+                    "date_to": {
+                        "type": "string",
+                        "description": "사용자가 특정 시점 이전의 특허만 원한다고 명시한 경우에만 지정하는 출원일 상한입니다. 'YYYY' 또는 'YYYY-MM-DD' 형식."
+                    },
+                    "applicants": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "사용자가 특정 출원인(회사/기관)의 특허만 원한다고 명시한 경우에만 지정하는 출원인 이름 목록입니다."
+                    },
+                    "exclude_applicants": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "사용자가 특정 출원인(예: 자기 회사)의 특허를 제외해 달라고 명시한 경우에만 지정하는 출원인 이름 목록입니다."
                     }
                 },
                 "required": ["query_text"],
@@ -161,13 +211,148 @@ EVAL_TOOLS = [
     }
 ]
 
+# 5-3. 배치 평가용 도구 정의 (여러 청크를 한 번에 평가)
+BATCH_EVAL_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "cal_batch_evalscore",
+            "description": "[사용자 아이디어]와 번호가 매겨진 여러 [특허 문서 조각] 각각의 유사도를 분석하여, 조각별 0-100점 사이의 점수와 그 근거를 한 번에 반환합니다.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "description": "주어진 모든 [특허 문서 조각]에 대한 평가 결과 목록. 조각마다 정확히 하나의 항목을 포함해야 합니다.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "index": {
+                                    "type": "integer",
+                                    "description": "평가 대상 [특허 문서 조각 #번호]의 번호."
+                                },
+                                "eval_score": {
+                                    "type": "integer",
+                                    "description": "[사용자 아이디어]와 해당 [특허 문서 조각] 간의 기술적 유사도 점수. 0 (완전히 무관함)에서 100 (기술적으로 동일함) 사이의 정수입니다.",
+                                    "minimum": 0,
+                                    "maximum": 100
+                                },
+                                "reason": {
+                                    "type": "string",
+                                    "description": "해당 점수를 부여한 구체적인 이유. 특허 조각의 어느 부분이 아이디어의 어떤 개념과 유사한지(또는 다른지) 명확히 짚어서 설명해야 합니다."
+                                }
+                            },
+                            "required": ["index", "eval_score", "reason"],
+                        },
+                    }
+                },
+                "required": ["results"],
+            },
+        },
+    }
+]
+
 TOOL_MAPPING = {"search_query": search_query}
 
+# 배치 분석에서 여러 호출을 한 번에 처리할 수 있는 도구 (첫 인자로 query_text 목록을 받음)
+BATCH_TOOL_MAPPING = {"search_query": search_queries}
+
+# 검색 도구 호출 시 LLM 인자에 더해 넘길 서버 측 옵션 (예: 서로 다른 특허를 최소 몇 개 확보할지)
+SEARCH_UNIQUE_K = 10
+TOOL_OPTIONS = {"search_query": {"unique_k": SEARCH_UNIQUE_K}}
+
+# API 요청으로 받은 검색 필터를 넘길 도구와 필터 인자 이름 (LLM 이 정한 같은 이름의 인자보다 우선)
+FILTERED_TOOLS = {"search_query"}
+SEARCH_FILTER_ARGS = ("date_from", "date_to", "applicants", "exclude_applicants")
+
+# 평가 프롬프트/도구가 바뀌면 자동으로 달라지는 버전 값 (평가 결과 캐시 키에 포함)
+# 개별 평가와 배치 평가는 프롬프트와 응답 형식이 다르므로 버전을 따로 두어 결과를 섞지 않음
+EVAL_PROMPT_VERSION = hashlib.sha256(
+    (EVALUATION_SYSTEM_PROMPT + json.dumps(EVAL_TOOLS, ensure_ascii=False, sort_keys=True)
+     + f"|chunk_budget={EVAL_CHUNK_TOKEN_BUDGET}").encode("utf-8")
+).hexdigest()[:12]
+BATCH_EVAL_PROMPT_VERSION = hashlib.sha256(
+    (EVALUATION_SYSTEM_PROMPT + BATCH_EVALUATION_INSTRUCTION + json.dumps(BATCH_EVAL_TOOLS, ensure_ascii=False, sort_keys=True)
+     + f"|chunk_budget={EVAL_CHUNK_TOKEN_BUDGET}|mode=batch").encode("utf-8")
+).hexdigest()[:12]
+
+
+class EvalResultCache:
+    """
+    (개선된 쿼리, 특허 청크, 모델명, 프롬프트 버전) 별 평가 결과 [eval_score, reason] 를 저장하는 SQLite 캐시.
+    """
+
+    def __init__(self, path=EVAL_CACHE_PATH, ttl=EVAL_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eval_results ("
+            "key TEXT PRIMARY KEY, eval_score INTEGER, reason TEXT, created_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_results_created ON eval_results(created_at)")
+        self._conn.commit()
+        self._puts_since_prune = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(improved_query, patent_chunk, model_name, prompt_version=EVAL_PROMPT_VERSION):
+        raw = "\0".join([normalize_query_text(improved_query), patent_chunk, model_name, prompt_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, improved_query, patent_chunk, model_name, prompt_version=EVAL_PROMPT_VERSION):
+        key = self.make_key(improved_query, patent_chunk, model_name, prompt_version)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT eval_score, reason, created_at FROM eval_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[2] > self.ttl:
+                self.stats["misses"] += 1
+                record_cache("evaluation", False)
+                return None
+            self.stats["hits"] += 1
+            record_cache("evaluation", True)
+            return [row[0], row[1]]
+
+    def put(self, improved_query, patent_chunk, model_name, eval_result, prompt_version=EVAL_PROMPT_VERSION):
+        key = self.make_key(improved_query, patent_chunk, model_name, prompt_version)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO eval_results (key, eval_score, reason, created_at) VALUES (?, ?, ?, ?)",
+                (key, int(eval_result[0]), eval_result[1], time.time())
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= 100:
+                # 유효 기간이 지난 항목 정리
+                self._puts_since_prune = 0
+                self._conn.execute("DELETE FROM eval_results WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM eval_results")
+            self._conn.commit()
+
+
+_eval_cache = None
+_eval_cache_lock = threading.Lock()
+
+def get_eval_cache():
+    """프로세스 공용 평가 결과 캐시를 반환합니다."""
+    global _eval_cache
+    with _eval_cache_lock:
+        if _eval_cache is None:
+            _eval_cache = EvalResultCache()
+    return _eval_cache
+
         
 def evaluation_idea(user_idea, patent_chunk, model_name, api_client):
-    print(f"[사용자 아이디어]: {user_idea}")
-    print(f"[특허 문서 조각]: {patent_chunk[:100]}")
+    log_payload("[사용자 아이디어]", user_idea)
+    log_payload("[특허 문서 조각]", patent_chunk, limit=100)
 
+    # 긴 청크는 아이디어와 관련 있는 문장만 남겨 토큰 예산 안으로 줄임
+    patent_chunk = compress_chunk(user_idea, patent_chunk)
     user_query = f"[사용자 아이디어]: {user_idea}\n\n[특허 문서 조각]: {patent_chunk}"
     
     messages = [
@@ -186,134 +371,512 @@ def evaluation_idea(user_idea, patent_chunk, model_name, api_client):
     "messages": messages
 }
     try:
-        response = api_client.chat.completions.create(**request)
+        with span("evaluation"):
+            response = api_client.chat.completions.create(**request)
+            record_usage("evaluation", response)
+            log_payload("[평가자 LLM 응답]", response.choices[0].message.content)
 
-        print("--------------------")
-        print("--------------------")
-        print(response.choices[0].message.content)
-        
-        for tool_call in response.choices[0].message.tool_calls:
+            for tool_call in response.choices[0].message.tool_calls:
 
-            tool_name = tool_call.function.name
-            tool_args = json.loads(tool_call.function.arguments)
+                tool_name = tool_call.function.name
+                tool_args = json.loads(tool_call.function.arguments)
 
-        eval_result = [tool_args["eval_score"], tool_args["reason"]]
+            eval_result = [tool_args["eval_score"], tool_args["reason"]]
         return eval_result
         
 
     except Exception as e:
-        print(f"\n--- [오류] LLM API 호출 또는 라우팅 중 오류 발생 ---")
-        print(f"에러 상세: {e}")
+        logger.error("[오류] 평가 LLM 호출 중 오류 발생: %s", e)
         return {"status": "error", "message": str(e)}
 
-def abstract_result(user_query, eval_results, model_name, api_client):
-    result = []
-    details = "[사용자 아이디어]\n-{user_query}\n\n[검색된 특허]\n"
+def evaluation_batch(user_idea, patent_chunks, model_name, api_client):
+    """
+    여러 특허 청크를 한 번의 LLM 호출로 평가합니다.
+
+    반환값: {청크 위치(0부터): [eval_score, reason]}
+    모델이 누락하거나 형식이 잘못된 항목은 결과에 포함되지 않으므로, 호출자가 개별 평가로 보완해야 합니다.
+    """
+    user_query = f"[사용자 아이디어]: {user_idea}\n\n"
+    for i, chunk in enumerate(patent_chunks):
+        user_query += f"[특허 문서 조각 #{i + 1}]: {compress_chunk(user_idea, chunk, stage='evaluation_batch')}\n\n"
+
+    messages = [
+        {"role": "system", "content": EVALUATION_SYSTEM_PROMPT + BATCH_EVALUATION_INSTRUCTION},
+        {"role": "user", "content": user_query},
+    ]
+    request = {
+        "model": model_name,
+        "tools": BATCH_EVAL_TOOLS,
+        "messages": messages
+    }
+    try:
+        with span("evaluation_batch"):
+            response = api_client.chat.completions.create(**request)
+            record_usage("evaluation_batch", response)
+            tool_calls = response.choices[0].message.tool_calls or []
+
+            batch_results = {}
+            for tool_call in tool_calls:
+                if tool_call.function.name != "cal_batch_evalscore":
+                    continue
+                tool_args = json.loads(tool_call.function.arguments)
+                for entry in tool_args.get("results") or []:
+                    try:
+                        position = int(entry["index"]) - 1
+                        score = int(entry["eval_score"])
+                        reason = entry["reason"]
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    if 0 <= position < len(patent_chunks) and isinstance(reason, str) and 0 <= score <= 100:
+                        batch_results[position] = [score, reason]
+        return batch_results
+
+    except Exception as e:
+        logger.error("[오류] 배치 평가 LLM 호출 중 오류 발생: %s", e)
+        return {}
+
+def _is_valid_eval(eval_result):
+    return isinstance(eval_result, list) and len(eval_result) == 2
+
+def _timed_evaluation(indices, improved_query, patent_chunks, model_name, api_client, elapsed_before=0.0):
+    """
+    청크 묶음 하나를 평가하고 ([(index, 평가 결과, 소요 시간), ...], 개별 평가가 필요한 index 목록, 소요 시간, 프롬프트 버전)을
+    반환합니다. 프롬프트 버전은 결과를 만든 평가 방식(개별/배치)의 버전으로, 평가 결과 캐시 키에 쓰입니다.
+
+    묶음이 2개 이상이면 배치 평가를 시도하고, 누락된 청크는 호출한 쪽이 스레드 풀에 개별 평가로 다시 제출합니다
+    (한 스레드에서 누락분을 차례로 평가하면 지연이 묶음 크기만큼 늘어나므로).
+    묶음이 1개면 바로 개별 평가합니다. elapsed_before 는 앞선 배치 평가에 걸린 시간으로, 소요 시간에 더해집니다.
+    """
+    start = time.perf_counter()
+    if len(indices) == 1:
+        idx = indices[0]
+        try:
+            eval_result = evaluation_idea(improved_query, patent_chunks[idx]['document'], model_name, api_client)
+        except Exception as e:
+            eval_result = {"status": "error", "message": str(e)}
+        elapsed = elapsed_before + time.perf_counter() - start
+        return [(idx, eval_result, elapsed)], [], elapsed, EVAL_PROMPT_VERSION
+
+    documents = [patent_chunks[idx]['document'] for idx in indices]
+    batch_results = evaluation_batch(improved_query, documents, model_name, api_client)
+    elapsed = elapsed_before + time.perf_counter() - start
+    outcomes = [(idx, batch_results[position], elapsed) for position, idx in enumerate(indices) if position in batch_results]
+    missing = [idx for position, idx in enumerate(indices) if position not in batch_results]
+    if missing:
+        logger.info("[배치 평가] %d/%d건 누락 -> 개별 평가로 대체", len(missing), len(indices))
+    return outcomes, missing, elapsed, BATCH_EVAL_PROMPT_VERSION
+
+def iter_evaluations(improved_query, patent_chunks, model_name, api_client, max_workers=None, batch_size=None, use_cache=None,
+                     executor=None):
+    """
+    검색된 특허 청크들을 스레드 풀에서 동시에 평가하고, 평가가 끝나는 순서대로 결과를 yield 합니다.
+
+    use_cache 가 True 이면 평가 결과 캐시에 있는 청크는 LLM 호출 없이 먼저 반환하고, 새 평가 결과를 캐시에 저장합니다.
+    캐시는 평가 방식별 프롬프트 버전으로 나뉘며, 조회는 이번 호출의 평가 방식(batch_size 기준) 버전으로만 합니다.
+    batch_size 가 2 이상이면 청크를 batch_size 개씩 묶어 한 번의 LLM 호출로 평가합니다.
+    max_workers / batch_size / use_cache 를 생략하면 EVAL_MAX_WORKERS / EVAL_BATCH_SIZE / EVAL_CACHE_ENABLED 를 따릅니다.
+    executor 를 주면 새 스레드 풀 대신 그 풀에 제출합니다 (여러 아이디어가 동시 호출 한도를 나눠 쓰는 배치 분석용).
+    각 항목: {"index", "metadata", "eval_result", "elapsed", "status", "cached"}
+    """
+    max_workers = EVAL_MAX_WORKERS if max_workers is None else max_workers
+    batch_size = EVAL_BATCH_SIZE if batch_size is None else batch_size
+    use_cache = EVAL_CACHE_ENABLED if use_cache is None else use_cache
+
+    def make_outcome(idx, eval_result, elapsed, cached):
+        return {
+            "index": idx,
+            "metadata": patent_chunks[idx]['metadata'],
+            "eval_result": eval_result,
+            "elapsed": elapsed,
+            # 평가 실패 시 evaluation_idea 는 에러 dict 를 반환
+            "status": "success" if _is_valid_eval(eval_result) else "error",
+            "cached": cached,
+        }
+
+    batch_size = max(1, batch_size)
+    cache = None
+    pending = list(range(len(patent_chunks)))
+    if use_cache and patent_chunks:
+        prompt_version = BATCH_EVAL_PROMPT_VERSION if batch_size > 1 else EVAL_PROMPT_VERSION
+        try:
+            cache = get_eval_cache()
+            cached_outcomes = []
+            pending = []
+            for idx, item in enumerate(patent_chunks):
+                cached = cache.get(improved_query, item['document'], model_name, prompt_version)
+                if cached is not None:
+                    cached_outcomes.append(make_outcome(idx, cached, 0.0, True))
+                else:
+                    pending.append(idx)
+        except Exception as e:
+            logger.warning("[평가 캐시] 조회 실패, 캐시 없이 진행합니다: %s", e)
+            cache, cached_outcomes, pending = None, [], list(range(len(patent_chunks)))
+        yield from cached_outcomes
+
+    if not pending:
+        return
+
+    groups = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+    def run(pool):
+        evaluate = bind_context(_timed_evaluation)
+        futures = {
+            pool.submit(evaluate, indices, improved_query, patent_chunks, model_name, api_client)
+            for indices in groups
+        }
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcomes, missing, elapsed, prompt_version = future.result()
+                # 배치 평가에서 누락된 청크는 개별 평가로 풀에 다시 제출해 동시에 처리
+                futures.update(
+                    pool.submit(evaluate, [idx], improved_query, patent_chunks, model_name, api_client, elapsed)
+                    for idx in missing
+                )
+                yield from finish(outcomes, prompt_version)
+
+    def finish(outcomes, prompt_version):
+        for idx, eval_result, elapsed in outcomes:
+            outcome = make_outcome(idx, eval_result, elapsed, False)
+            if outcome["status"] == "success" and cache is not None:
+                try:
+                    cache.put(improved_query, patent_chunks[idx]['document'], model_name, eval_result, prompt_version)
+                except Exception as e:
+                    logger.warning("[평가 캐시] 저장 실패: %s", e)
+            yield outcome
+
+    if executor is not None:
+        yield from run(executor)
+        return
+    # 배치 평가 누락분도 동시에 개별 평가할 수 있도록 청크 수 기준으로 스레드 수를 정함 (스레드는 필요할 때만 생성)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+        yield from run(pool)
+
+def evaluate_chunks(improved_query, patent_chunks, model_name, api_client, max_workers=None, batch_size=None, use_cache=None,
+                    executor=None):
+    """
+    검색된 특허 청크들을 동시에 평가하고 모든 결과를 모아 반환합니다. (iter_evaluations 참고)
+
+    결과는 patent_chunks 의 순서를 유지하며, 평가에 실패한 청크는 결과에서 제외됩니다.
+    반환값: (eval_results, timings)
+      - eval_results: [(patent_metadata, [eval_score, reason]), ...]
+      - timings: [{"index", "ApplicationNumber", "elapsed", "status", "cached"}, ...] (청크 순서)
+    """
+    outcomes = sorted(
+        iter_evaluations(improved_query, patent_chunks, model_name, api_client, max_workers, batch_size, use_cache, executor),
+        key=lambda outcome: outcome["index"]
+    )
+
+    eval_results = []
+    timings = []
+    for outcome in outcomes:
+        patent_metadata = outcome["metadata"]
+        timings.append({
+            "index": outcome["index"],
+            "ApplicationNumber": patent_metadata.get('ApplicationNumber'),
+            "elapsed": outcome["elapsed"],
+            "status": outcome["status"],
+            "cached": outcome["cached"],
+        })
+        if outcome["status"] == "success":
+            eval_results.append((patent_metadata, outcome["eval_result"]))
+        else:
+            logger.warning("[평가 실패] %s: %s", patent_metadata.get('ApplicationNumber'), outcome['eval_result'])
+
+    return eval_results, timings
+
+def _build_abstract_request(user_query, eval_results, model_name):
+    # 평가 정보는 점수가 높은 특허부터 토큰 예산 안에서만 포함
+    packed = pack_evaluations(eval_results)
+    details = f"[사용자 아이디어]\n-{user_query}\n\n[검색된 특허]\n"
     
-    for i in range(len(eval_results)):
-        details += f"{i+1}.\n-제목: {eval_results[i][0].get('InventionName')}\n-평가정보: {eval_results[i][1][1]}\n\n"
+    for i in range(len(packed)):
+        details += f"{i+1}.\n-제목: {packed[i][0].get('InventionName')}\n-평가정보: {packed[i][1][1]}\n\n"
     
     messages = [
-  {
-    "role": "system",
-    "content": ABSTRACTOR_SYSTEM_PROMPT
-  },
-  {
-    "role": "user",
-    "content": details,
-  }
-]
-    request = {
-    "model": model_name,
-    "messages": messages
-}
+        {"role": "system", "content": ABSTRACTOR_SYSTEM_PROMPT},
+        {"role": "user", "content": details},
+    ]
+    return {
+        "model": model_name,
+        "messages": messages
+    }
+
+def abstract_result(user_query, eval_results, model_name, api_client):
+    request = _build_abstract_request(user_query, eval_results, model_name)
 
     try:
-        # 1. '아이디어 게이트키퍼' LLM 호출
-        response = api_client.chat.completions.create(**request)
+        # 1. '요약기' LLM 호출
+        with span("abstract"):
+            response = api_client.chat.completions.create(**request)
+        record_usage("abstract", response)
 
         response_content = response.choices[0].message.content
-        print("\n[게이트키퍼 LLM 응답]")
-        print("--------------------")
-        print("--------------------")
-        print(response_content)
+        log_payload("[요약기 LLM 응답]", response_content)
         
         return response_content
             
     except Exception as e:
-        print(f"\n--- [오류] LLM API 호출 또는 라우팅 중 오류 발생 ---")
-        print(f"에러 상세: {e}")
+        logger.error("[오류] 요약기 LLM 호출 중 오류 발생: %s", e)
 
-def execute_router(user_query, model_name, api_client):
-    success_bool = False
+def stream_abstract_result(user_query, eval_results, model_name, api_client):
     """
-    사용자 아이디어를 받아 게이트키퍼 LLM을 호출하고,
-    결과에 따라 RAG 검색을 트리거하거나 사용자에게 피드백을 반환합니다.
+    abstract_result 의 스트리밍 버전. 모델이 생성하는 마크다운 보고서 조각을 도착하는 대로 yield 합니다.
+    """
+    request = _build_abstract_request(user_query, eval_results, model_name)
+    with span("abstract_stream"):
+        response = api_client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+        for chunk in response:
+            if getattr(chunk, "usage", None):
+                record_usage("abstract_stream", chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+def route_idea(user_query, model_name, api_client):
     """
+    게이트키퍼(라우터) LLM을 호출합니다.
 
-    print(f"\n--- [EXECUTE ROUTER] ---")
-    print(f"입력 아이디어: '{user_query}'")
+    반환값: (response_text, tool_name, tool_args). 검색 도구를 호출하지 않았다면 tool_name 은 None 입니다.
+    """
+    log_payload("[라우터 입력 아이디어]", user_query)
 
     messages = [
-  {
-    "role": "system",
-    "content": ROUTER_SYSTEM_PROMPT
-  },
-  {
-    "role": "user",
-    "content": user_query,
-  }
-]
+        {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+        {"role": "user", "content": user_query},
+    ]
     request = {
-    "model": model_name,
-    "tools": SEARCH_TOOLS,
-    "messages": messages
-}
-    try:
-        # 1. '아이디어 게이트키퍼' LLM 호출
-
+        "model": model_name,
+        "tools": SEARCH_TOOLS,
+        "messages": messages
+    }
+    # 1. '아이디어 게이트키퍼' LLM 호출
+    with span("router"):
         response = api_client.chat.completions.create(**request)
+        record_usage("router", response)
         response_text = response.choices[0].message.content
+        log_payload("[게이트키퍼 LLM 응답]", response_text)
 
-        print("\n[게이트키퍼 LLM 응답]")
-        print("--------------------")
-        print("--------------------")
-        print(response.choices[0].message.content)
-        
-        if not response.choices[0].message.tool_calls:
-            return success_bool, None, response_text
-
-        success_bool = True
-        
-        for tool_call in response.choices[0].message.tool_calls:
-
+        tool_name, tool_args = None, None
+        for tool_call in response.choices[0].message.tool_calls or []:
             tool_name = tool_call.function.name
             tool_args = json.loads(tool_call.function.arguments)
+    logger.info("[라우터] 검색 도구 호출: %s", tool_name is not None)
+    return response_text, tool_name, tool_args
+
+def apply_filters(tool_name, tool_args, filters):
+    """
+    API 요청의 검색 필터(SEARCH_FILTER_ARGS 키의 dict)를 라우터가 만든 도구 인자에 덮어씁니다.
+    값이 비어 있는 필터는 무시하며, 필터를 받지 않는 도구면 인자를 그대로 반환합니다.
+    """
+    if not filters or tool_name not in FILTERED_TOOLS:
+        return tool_args
+    return dict(tool_args, **{key: filters[key] for key in SEARCH_FILTER_ARGS if filters.get(key)})
+
+def retrieve_candidates(tool_name, tool_args, rerank=None):
+    """
+    라우터가 호출한 검색 도구를 실행하고, rerank 가 True 이면 LLM 평가 전에 가망 없는 후보를 걸러냅니다.
+    rerank 를 생략하면 RERANK_ENABLED 를 따릅니다.
+    """
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    patent_chunks = TOOL_MAPPING[tool_name](**tool_args, **TOOL_OPTIONS.get(tool_name, {}))
+    if patent_chunks and rerank:
+        with span("rerank"):
+            patent_chunks = prune_candidates(tool_args['query_text'], patent_chunks)
+    return patent_chunks
+
+NO_PATENT_FOUND_MESSAGE = "사용자님의 아이디어에 대해 유사한 특허를 검색 시도 하였으나 발견된 특허가 존재하지 않습니다."
+
+def execute_router(user_query, model_name, api_client, filters=None):
+    """
+    사용자 아이디어를 받아 게이트키퍼 LLM을 호출하고,
+    결과에 따라 RAG 검색을 트리거하거나 사용자에게 피드백을 반환합니다.
+    filters: 검색에 적용할 출원일/출원인 조건 (apply_filters 참고)
+
+    반환값: (success_bool, eval_results, result, complete)
+      - complete: 모든 후보 평가와 요약이 성공했는지 여부. 일부 평가가 실패했거나 요약 LLM 호출이 실패해
+        결과가 불완전하면 False 이며, 이런 결과는 캐시하지 않습니다.
+    """
+    success_bool = False
+    try:
+        with span("pipeline"):
+            response_text, tool_name, tool_args = route_idea(user_query, model_name, api_client)
+            if tool_name is None:
+                return success_bool, None, response_text, False
+
+            success_bool = True
             improved_query = tool_args['query_text']
+            patent_chunks = retrieve_candidates(tool_name, apply_filters(tool_name, tool_args, filters))
 
-        eval_results = []
-        patent_chunks = TOOL_MAPPING[tool_name](**tool_args)
+            if not patent_chunks:
+                success_bool = False
+                return success_bool, None, NO_PATENT_FOUND_MESSAGE, False
+            eval_results, eval_timings = evaluate_chunks(improved_query, patent_chunks, model_name, api_client)
+            logger.info("평가 완료: %d/%d건 성공 (캐시 %d건), 최대 소요 %.2fs",
+                        len(eval_results), len(patent_chunks), sum(t['cached'] for t in eval_timings),
+                        max((t['elapsed'] for t in eval_timings), default=0))
 
-        if not patent_chunks:
-            success_bool = False
-            response_txt = "사용자님의 아이디어에 대해 유사한 특허를 검색 시도 하였으나 발견된 특허가 존재하지 않습니다."
-            return success_bool, None, response_txt
-        print("debug: 체크")
-        for idx, item in enumerate(patent_chunks):
-            patent_metadata = item['metadata']
-            document = item['document']
-            eval_result = evaluation_idea(improved_query, document, model_name, api_client)
-            eval_results.append((patent_metadata, eval_result))
-
-        result = abstract_result(user_query, eval_results,model_name, api_client)
+            result = abstract_result(user_query, eval_results,model_name, api_client)
         
-        return success_bool, eval_results, result
+        return success_bool, eval_results, result, len(eval_results) == len(patent_chunks) and result is not None
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(error_trace)
-        print(f"Error occurred: {e}")
-        print(f"\n--- [오류] LLM API 호출 또는 라우팅 중 오류 발생 ---")
-        print(f"에러 상세: {e}")
-        return "error", None, str(e)
-        
+        logger.exception("[오류] LLM API 호출 또는 라우팅 중 오류 발생: %s", e)
+        return "error", None, str(e), False
 
+def stream_router(user_query, model_name, api_client, filters=None):
+    """
+    execute_router 의 스트리밍 버전. 파이프라인 각 단계가 끝날 때마다 이벤트 dict 를 yield 합니다.
+
+      - {"type": "router", "chatResponse": 라우터 응답, "searching": 검색 진행 여부}
+      - {"type": "evaluation", "index": 검색 순위, "metadata": ..., "eval_result": [eval_score, reason]} (평가 완료 순)
+      - {"type": "abstract", "delta": 보고서 조각}
+      - {"type": "done", "status": "success" | "failed", "chatResponse": 최종 메시지(실패 시),
+         "complete": 모든 후보 평가가 성공했는지 여부(성공 시)}
+      - {"type": "error", "message": ...}
+    """
+    try:
+        response_text, tool_name, tool_args = route_idea(user_query, model_name, api_client)
+        yield {"type": "router", "chatResponse": response_text, "searching": tool_name is not None}
+        if tool_name is None:
+            yield {"type": "done", "status": "failed", "chatResponse": response_text}
+            return
+
+        improved_query = tool_args['query_text']
+        patent_chunks = retrieve_candidates(tool_name, apply_filters(tool_name, tool_args, filters))
+        if not patent_chunks:
+            yield {"type": "done", "status": "failed", "chatResponse": NO_PATENT_FOUND_MESSAGE}
+            return
+
+        outcomes = []
+        for outcome in iter_evaluations(improved_query, patent_chunks, model_name, api_client):
+            if outcome["status"] != "success":
+                logger.warning("[평가 실패] %s: %s", outcome['metadata'].get('ApplicationNumber'), outcome['eval_result'])
+                continue
+            outcomes.append(outcome)
+            yield {
+                "type": "evaluation",
+                "index": outcome["index"],
+                "metadata": outcome["metadata"],
+                "eval_result": outcome["eval_result"],
+            }
+
+        outcomes.sort(key=lambda outcome: outcome["index"])
+        eval_results = [(outcome["metadata"], outcome["eval_result"]) for outcome in outcomes]
+        for delta in stream_abstract_result(user_query, eval_results, model_name, api_client):
+            yield {"type": "abstract", "delta": delta}
+
+        yield {"type": "done", "status": "success", "complete": len(outcomes) == len(patent_chunks)}
+    except Exception as e:
+        record_error("pipeline_stream")
+        logger.exception("[오류] LLM API 호출 또는 라우팅 중 오류 발생: %s", e)
+        yield {"type": "error", "message": str(e)}
+
+def retrieve_candidates_batch(calls, rerank=None):
+    """
+    retrieve_candidates 의 배치 버전. calls: [(tool_name, tool_args), ...] 순서대로 후보 목록을 반환합니다.
+    BATCH_TOOL_MAPPING 에 있는 도구는 query_text 외의 인자가 같은 호출끼리 묶어 한 번에 검색합니다.
+    """
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    results = [None] * len(calls)
+    groups = {}
+    for i, (tool_name, tool_args) in enumerate(calls):
+        if tool_name in BATCH_TOOL_MAPPING:
+            extra = {key: value for key, value in tool_args.items() if key != 'query_text'}
+            groups.setdefault((tool_name, json.dumps(extra, ensure_ascii=False, sort_keys=True)), []).append(i)
+        else:
+            results[i] = retrieve_candidates(tool_name, tool_args, rerank)
+
+    for (tool_name, extra), positions in groups.items():
+        query_texts = [calls[i][1]['query_text'] for i in positions]
+        found = BATCH_TOOL_MAPPING[tool_name](query_texts, **json.loads(extra), **TOOL_OPTIONS.get(tool_name, {}))
+        for i, query_text, patent_chunks in zip(positions, query_texts, found):
+            if patent_chunks and rerank:
+                with span("rerank"):
+                    patent_chunks = prune_candidates(query_text, patent_chunks)
+            results[i] = patent_chunks
+    return results
+
+def _route_safely(user_query, model_name, api_client):
+    try:
+        return route_idea(user_query, model_name, api_client), None
+    except Exception as e:
+        logger.exception("[오류] 배치 라우팅 중 오류 발생: %s", e)
+        return None, e
+
+def _finish_idea(user_query, improved_query, patent_chunks, model_name, api_client, executor):
+    """검색까지 끝난 아이디어 하나의 평가와 요약을 공유 스레드 풀에서 실행하고 execute_router 와 같은 형식으로 반환합니다."""
+    try:
+        eval_results, _ = evaluate_chunks(improved_query, patent_chunks, model_name, api_client, executor=executor)
+        result = executor.submit(bind_context(abstract_result), user_query, eval_results, model_name, api_client).result()
+        return True, eval_results, result, len(eval_results) == len(patent_chunks) and result is not None
+    except Exception as e:
+        logger.exception("[오류] 배치 평가/요약 중 오류 발생: %s", e)
+        return "error", None, str(e), False
+
+def execute_router_batch(user_queries, model_name, api_client, max_workers=None, ideas_in_flight=None, filters=None):
+    """
+    execute_router 의 배치 버전. 여러 아이디어를 한 번에 분석하고, 아이디어 분석이 끝나는 순서대로
+    (입력 위치, (success_bool, eval_results, result, complete)) 를 yield 합니다.
+
+    1. 라우터: 공유 스레드 풀에서 동시에 호출 (정규화 후 같은 아이디어는 한 번만 분석해 결과를 나눠 줌)
+    2. 검색: 재작성된 쿼리들을 배치 임베딩 한 번 + 다중 쿼리 collection.query 한 번으로 검색
+    3. 평가/요약: 모든 아이디어의 LLM 호출이 max_workers 개의 동시 호출 한도를 나눠 씀
+    filters 는 모든 아이디어의 검색에 같은 조건으로 적용됩니다.
+    max_workers / ideas_in_flight 를 생략하면 BATCH_MAX_WORKERS / BATCH_IDEAS_IN_FLIGHT 를 따릅니다.
+    """
+    max_workers = BATCH_MAX_WORKERS if max_workers is None else max_workers
+    ideas_in_flight = BATCH_IDEAS_IN_FLIGHT if ideas_in_flight is None else ideas_in_flight
+
+    positions = {}
+    for i, user_query in enumerate(user_queries):
+        positions.setdefault(normalize_query_text(user_query), []).append(i)
+    fan_out = list(positions.values())
+    unique_queries = [user_queries[group[0]] for group in fan_out]
+
+    def emit(u, outcome):
+        for i in fan_out[u]:
+            yield i, outcome
+
+    with span("pipeline_batch"), ThreadPoolExecutor(max_workers=max(1, max_workers)) as llm_pool:
+        route = bind_context(_route_safely)
+        routed = list(llm_pool.map(lambda user_query: route(user_query, model_name, api_client), unique_queries))
+
+        searching = []
+        for u, (route_result, error) in enumerate(routed):
+            if error is not None:
+                yield from emit(u, ("error", None, str(error), False))
+            elif route_result[1] is None:
+                yield from emit(u, (False, None, route_result[0], False))
+            else:
+                searching.append(u)
+        logger.info("[배치 라우터] 아이디어 %d개 (중복 제외 %d개) 중 %d개 검색 진행",
+                    len(user_queries), len(unique_queries), len(searching))
+
+        try:
+            candidates = retrieve_candidates_batch([
+                (routed[u][0][1], apply_filters(routed[u][0][1], routed[u][0][2], filters)) for u in searching
+            ])
+        except Exception as e:
+            logger.exception("[오류] 배치 검색 중 오류 발생: %s", e)
+            for u in searching:
+                yield from emit(u, ("error", None, str(e), False))
+            return
+
+        ready = []
+        for u, patent_chunks in zip(searching, candidates):
+            if patent_chunks:
+                ready.append((u, patent_chunks))
+            else:
+                yield from emit(u, (False, None, NO_PATENT_FOUND_MESSAGE, False))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(ideas_in_flight, len(ready)))) as idea_pool:
+            finish = bind_context(_finish_idea)
+            futures = {
+                idea_pool.submit(finish, unique_queries[u], routed[u][0][2]['query_text'], patent_chunks,
+                                 model_name, api_client, llm_pool): u
+                for u, patent_chunks in ready
+            }
+            for future in as_completed(futures):
+                yield from emit(futures[future], future.result())
@@ -0,0 +1,412 @@
+import pandas as pd
+import chromadb
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import argparse
+from .Embeddings import BatchEmbeddingFunction
+from .Retrieval import GOOGLE_API_KEY, DEFAULT_DB_PATH, DEFAULT_COLLECTION_NAME, DEFAULT_EMBEDDING_MODEL, mark_collection_changed
+from .Lexical import DEFAULT_BM25_PATH, build_lexical_index, update_lexical_index
+from .VectorIndex import export_vector_index, VECTOR_INDEX_DTYPE
+from .Filters import filter_fields, DATE_FIELD, APPLICANT_FIELD
+
+# 특허 CSV 의 메타데이터 컬럼 (검색 결과와 Frontend 응답에 그대로 사용)
+PATENT_METADATA_COLUMNS = ("ApplicationNumber", "InventionName", "ApplicationDate", "Applicant")
+# 임베딩할 본문 컬럼 후보. CSV 에 존재하는 컬럼만 순서대로 이어 붙여 사용
+PATENT_TEXT_COLUMNS = ("InventionName", "Abstract", "Claims")
+
+INGEST_STATE_PATH = "./ingest_state.sqlite3"
+CSV_CHUNK_SIZE = 5000        # 한 번에 읽어 들일 CSV 행 수
+EMBED_BATCH_SIZE = 100       # 임베딩 배치 요청 한 번에 보낼 패시지 수 (여러 배치를 동시에 보낸 뒤 함께 upsert)
+PASSAGE_MAX_CHARS = 1000     # 패시지 최대 길이(문자)
+PASSAGE_OVERLAP_CHARS = 100  # 인접 패시지 간 겹치는 길이(문자)
+LEXICAL_DELTA_MAX_CHUNKS = 200_000  # 이보다 많은 패시지가 바뀌면 BM25 역색인을 증분 갱신 대신 전체 재구축
+DERIVED_INDEXES = ("lexical", "vector")  # 컬렉션에서 파생되어 적재 후 갱신해야 하는 색인
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?다])\s+|\n+")
+
+
+def split_passages(text, max_chars=PASSAGE_MAX_CHARS, overlap=PASSAGE_OVERLAP_CHARS):
+    """
+    특허 본문을 문장 경계 기준으로 max_chars 이하의 패시지들로 나눕니다.
+    인접 패시지는 앞 패시지의 끝 overlap 글자를 공유해 문맥이 끊기지 않게 합니다.
+    """
+    text = re.sub(r"[ \t]+", " ", text or "").strip()
+    if not text:
+        return []
+    if len(text) <= max_chars:
+        return [text]
+
+    sentences = []
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        # 한 문장이 너무 길면 강제로 자름
+        while len(sentence) > max_chars:
+            sentences.append(sentence[:max_chars])
+            sentence = sentence[max_chars - overlap:]
+        if sentence:
+            sentences.append(sentence)
+
+    passages = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            passages.append(current)
+            tail = current[-overlap:] if overlap else ""
+            current = f"{tail} {sentence}".strip() if len(tail) + 1 + len(sentence) <= max_chars else sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value).strip()
+
+
+def build_patent_passages(row, text_columns):
+    """
+    CSV 한 행을 (content_hash, [(passage_id, document, metadata), ...]) 로 변환합니다.
+    """
+    app_number = _clean(row.get("ApplicationNumber"))
+    metadata = {column: _clean(row.get(column)) for column in PATENT_METADATA_COLUMNS}
+    body = "\n".join(_clean(row.get(column)) for column in text_columns if _clean(row.get(column)))
+
+    content_hash = hashlib.sha256(
+        "\0".join([body] + [metadata[column] for column in PATENT_METADATA_COLUMNS]).encode("utf-8")
+    ).hexdigest()
+
+    # 검색 필터 pushdown 용 정규화 필드 (정수 출원일, 출원인 식별자)
+    metadata.update(filter_fields(metadata))
+
+    passages = []
+    for i, passage in enumerate(split_passages(body)):
+        passage_metadata = dict(metadata)
+        passage_metadata["ChunkIndex"] = i
+        passage_metadata["ContentHash"] = content_hash
+        passages.append((f"{app_number}_{i}", passage, passage_metadata))
+    return content_hash, passages
+
+
+class IngestState:
+    """
+    적재 진행 상황을 기록하는 SQLite 체크포인트.
+      - patents: 특허별 마지막으로 적재한 본문 해시와 패시지 수 (변경 없는 행 건너뛰기, 남은 패시지 삭제용)
+      - progress: CSV 파일별 처리 완료한 행 수 (중단 후 재시작 시 이어서 처리)
+      - index_dirty, index_pending: 컬렉션에는 반영됐지만 BM25/벡터 색인에는 아직 반영되지 않은 변경.
+        청크 체크포인트와 같은 트랜잭션으로 기록하고 색인 갱신이 끝난 뒤에만 지우므로,
+        중단 후 재시작해 해당 행을 건너뛰더라도 색인 갱신이 누락되지 않습니다.
+    """
+
+    def __init__(self, path=INGEST_STATE_PATH):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS patents ("
+            "collection TEXT, app_number TEXT, content_hash TEXT, n_passages INTEGER, "
+            "PRIMARY KEY (collection, app_number))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            "collection TEXT, source TEXT, signature TEXT, rows_done INTEGER, updated_at REAL, "
+            "PRIMARY KEY (collection, source))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_dirty ("
+            "collection TEXT, index_name TEXT, rebuild INTEGER, PRIMARY KEY (collection, index_name))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_pending ("
+            "collection TEXT, chunk_id TEXT, deleted INTEGER, PRIMARY KEY (collection, chunk_id))"
+        )
+        self._conn.commit()
+
+    def get_progress(self, collection, source, signature):
+        row = self._conn.execute(
+            "SELECT signature, rows_done FROM progress WHERE collection = ? AND source = ?", (collection, source)
+        ).fetchone()
+        # 파일 내용이 바뀌었다면 처음부터 다시 읽되, 변경 없는 행은 해시 비교로 건너뜀
+        if row is None or row[0] != signature:
+            return 0
+        return row[1]
+
+    def get_patents(self, collection, app_numbers):
+        known = {}
+        app_numbers = list(app_numbers)
+        for start in range(0, len(app_numbers), 500):
+            batch = app_numbers[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for app_number, content_hash, n_passages in self._conn.execute(
+                f"SELECT app_number, content_hash, n_passages FROM patents "
+                f"WHERE collection = ? AND app_number IN ({placeholders})",
+                [collection] + batch
+            ):
+                known[app_number] = (content_hash, n_passages)
+        return known
+
+    def commit_chunk(self, collection, source, signature, rows_done, patents, changed_ids=(), deleted_ids=()):
+        """
+        CSV 청크 하나가 Chroma 에 반영된 뒤 호출합니다. 특허 해시, 진행 위치와 색인에 반영할 변경 청크 id 를 한 트랜잭션으로 기록합니다.
+        변경 청크 id 가 LEXICAL_DELTA_MAX_CHUNKS 를 넘으면 id 대신 BM25 전체 재구축 표시만 남깁니다.
+        """
+        with self._conn:
+            if changed_ids or deleted_ids:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO index_dirty (collection, index_name, rebuild) VALUES (?, ?, 0)",
+                    [(collection, index_name) for index_name in DERIVED_INDEXES]
+                )
+                rebuild = self._conn.execute(
+                    "SELECT rebuild FROM index_dirty WHERE collection = ? AND index_name = 'lexical'", (collection,)
+                ).fetchone()[0]
+                if not rebuild:
+                    # 같은 청크가 여러 번 바뀌면 마지막 상태(갱신/삭제)만 남김
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO index_pending (collection, chunk_id, deleted) VALUES (?, ?, ?)",
+                        [(collection, chunk_id, 0) for chunk_id in changed_ids]
+                        + [(collection, chunk_id, 1) for chunk_id in deleted_ids]
+                    )
+                    n_pending = self._conn.execute(
+                        "SELECT COUNT(*) FROM index_pending WHERE collection = ?", (collection,)
+                    ).fetchone()[0]
+                    if n_pending > LEXICAL_DELTA_MAX_CHUNKS:
+                        self._conn.execute(
+                            "UPDATE index_dirty SET rebuild = 1 WHERE collection = ? AND index_name = 'lexical'", (collection,)
+                        )
+                        self._conn.execute("DELETE FROM index_pending WHERE collection = ?", (collection,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO patents (collection, app_number, content_hash, n_passages) VALUES (?, ?, ?, ?)",
+                [(collection, app_number, content_hash, n_passages) for app_number, (content_hash, n_passages) in patents.items()]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO progress (collection, source, signature, rows_done, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (collection, source, signature, rows_done, time.time())
+            )
+
+    def dirty_indexes(self, collection):
+        """색인에 아직 반영되지 않은 변경이 있는 색인 이름 -> 전체 재구축 필요 여부."""
+        return dict(self._conn.execute(
+            "SELECT index_name, rebuild FROM index_dirty WHERE collection = ?", (collection,)
+        ).fetchall())
+
+    def pending_lexical_changes(self, collection):
+        """BM25 증분 갱신에 쓸 (변경된 청크 id 집합, 삭제된 청크 id 집합)."""
+        changed_ids, deleted_ids = set(), set()
+        for chunk_id, deleted in self._conn.execute(
+            "SELECT chunk_id, deleted FROM index_pending WHERE collection = ?", (collection,)
+        ):
+            (deleted_ids if deleted else changed_ids).add(chunk_id)
+        return changed_ids, deleted_ids
+
+    def clear_index(self, collection, index_name):
+        """색인 갱신이 성공한 뒤 호출합니다. BM25 가 반영되면 대기 중인 청크 id 도 지웁니다."""
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM index_dirty WHERE collection = ? AND index_name = ?", (collection, index_name)
+            )
+            if index_name == "lexical":
+                self._conn.execute("DELETE FROM index_pending WHERE collection = ?", (collection,))
+
+    def close(self):
+        self._conn.close()
+
+
+def _file_signature(csv_path):
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def process_patents_to_chroma(csv_path, db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME,
+                              model_name=DEFAULT_EMBEDDING_MODEL, text_columns=PATENT_TEXT_COLUMNS,
+                              chunksize=CSV_CHUNK_SIZE, embed_batch_size=EMBED_BATCH_SIZE,
+                              state_path=INGEST_STATE_PATH, resume=True, encoding="utf-8",
+                              lexical_index_path=DEFAULT_BM25_PATH, vector_index_path=None, vector_dtype=VECTOR_INDEX_DTYPE,
+                              ivf_lists=0):
+    """
+    특허 CSV 를 청크 단위로 스트리밍하며 패시지로 나누고, 임베딩을 배치로 요청해 Chroma 컬렉션에 upsert 합니다.
+
+    - 패시지 embed_batch_size 개를 배치 요청 한 번으로 임베딩하며, 배치 여러 개를 동시에 보냅니다
+      (module.Embeddings.BatchEmbeddingFunction: 429 백오프 재시도 포함).
+
+    - 청크가 반영될 때마다 진행 위치를 체크포인트에 기록하므로, 중단되면 resume=True 로 다시 실행해 이어서 처리합니다.
+    - 본문/메타데이터 해시가 이전 적재와 같은 특허는 임베딩 없이 건너뜁니다 (증분 갱신).
+    - 특허 본문이 짧아져 패시지 수가 줄어든 경우 남은 이전 패시지는 삭제합니다.
+    - 컬렉션이 바뀌었다면 마지막에 하이브리드 검색용 BM25 역색인에 반영합니다 (lexical_index_path=None 이면 생략).
+      바뀐 패시지가 적으면 바뀐 부분만 delta 세그먼트로 갱신하고, 많거나 역색인이 없으면 전체를 다시 만듭니다.
+    - vector_index_path 를 주면 같은 조건에서 mmap 양자화 벡터 색인(module.VectorIndex)도 다시 내보냅니다.
+    - 색인에 반영할 변경은 체크포인트(IngestState)에 함께 기록되므로, 이전 실행이 색인 갱신 전에 중단됐다면
+      이번 실행에서 바뀐 행이 없더라도 그 변경을 마저 반영합니다.
+
+    반환값: {"rows", "skipped", "upserted_patents", "upserted_passages", "deleted_passages"}
+    """
+    client = chromadb.PersistentClient(path=db_path)
+    embedding_func = BatchEmbeddingFunction(
+        api_key=GOOGLE_API_KEY,
+        model_name=model_name,
+        batch_size=embed_batch_size,
+    )
+    # 동시에 보내는 배치 수만큼 묶어 임베딩한 뒤 한 번에 upsert
+    upsert_size = embedding_func.batch_size * max(1, embedding_func.max_concurrency)
+    collection = client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=embedding_func,
+        metadata={"hnsw:space": "cosine"}
+    )
+
+    state = IngestState(state_path)
+    source = os.path.abspath(csv_path)
+    signature = _file_signature(csv_path)
+    rows_done = state.get_progress(collection_name, source, signature) if resume else 0
+    if rows_done:
+        print(f"체크포인트에서 재개합니다: {rows_done}행 이후부터 처리")
+
+    stats = {"rows": rows_done, "skipped": 0, "upserted_patents": 0, "upserted_passages": 0, "deleted_passages": 0}
+    reader = pd.read_csv(
+        csv_path,
+        chunksize=chunksize,
+        dtype=str,
+        encoding=encoding,
+        skiprows=range(1, rows_done + 1) if rows_done else None,
+    )
+    available_text_columns = None
+
+    try:
+        for frame in reader:
+            raw_rows = len(frame)
+            if available_text_columns is None:
+                available_text_columns = [column for column in text_columns if column in frame.columns]
+                if not available_text_columns:
+                    raise ValueError(f"CSV 에 본문 컬럼이 없습니다. 후보: {list(text_columns)}")
+
+            frame = frame[frame["ApplicationNumber"].notna()]
+            # 같은 청크 안에서 중복된 특허는 마지막 행만 사용
+            frame = frame.drop_duplicates(subset="ApplicationNumber", keep="last")
+            known = state.get_patents(collection_name, frame["ApplicationNumber"].map(_clean))
+
+            ids, documents, metadatas, stale_ids = [], [], [], []
+            changed = {}
+            for row in frame.to_dict("records"):
+                app_number = _clean(row["ApplicationNumber"])
+                content_hash, passages = build_patent_passages(row, available_text_columns)
+                previous = known.get(app_number)
+                if previous and previous[0] == content_hash:
+                    stats["skipped"] += 1
+                    continue
+
+                for passage_id, document, metadata in passages:
+                    ids.append(passage_id)
+                    documents.append(document)
+                    metadatas.append(metadata)
+                if previous and previous[1] > len(passages):
+                    stale_ids.extend(f"{app_number}_{i}" for i in range(len(passages), previous[1]))
+                changed[app_number] = (content_hash, len(passages))
+
+            for start in range(0, len(ids), upsert_size):
+                end = start + upsert_size
+                collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=embedding_func(documents[start:end]),
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                )
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+            if ids or stale_ids:
+                mark_collection_changed(db_path, collection_name)
+
+            stats["rows"] += raw_rows
+            stats["upserted_patents"] += len(changed)
+            stats["upserted_passages"] += len(ids)
+            stats["deleted_passages"] += len(stale_ids)
+            state.commit_chunk(collection_name, source, signature, stats["rows"], changed, ids, stale_ids)
+            print(f"[적재] {stats['rows']}행 처리 (변경 {stats['upserted_patents']}건, 건너뜀 {stats['skipped']}건, "
+                  f"패시지 {stats['upserted_passages']}개)")
+
+        print(f"'{collection_name}' 컬렉션 적재 완료: {stats}")
+        dirty = state.dirty_indexes(collection_name)
+        if lexical_index_path and ("lexical" in dirty or not os.path.isdir(lexical_index_path)):
+            if not dirty.get("lexical") and os.path.isdir(lexical_index_path):
+                changed_ids, deleted_ids = state.pending_lexical_changes(collection_name)
+                update_lexical_index(collection, changed_ids, deleted_ids, lexical_index_path)
+            else:
+                build_lexical_index(collection, lexical_index_path)
+            state.clear_index(collection_name, "lexical")
+        if vector_index_path and ("vector" in dirty or not os.path.isdir(vector_index_path)):
+            export_vector_index(collection, vector_index_path, dtype=vector_dtype, ivf_lists=ivf_lists)
+            state.clear_index(collection_name, "vector")
+    finally:
+        state.close()
+
+    print("서버가 실행 중이라면 get_retriever().reload() 로 컬렉션 핸들을 갱신하세요.")
+    return stats
+
+
+def backfill_filter_fields(collection, page_size=1000, db_path=DEFAULT_DB_PATH):
+    """
+    정규화 필드(ApplicationDateInt, ApplicantId)가 없는 이전 적재분의 메타데이터를 채웁니다.
+    본문 해시가 같아 다시 적재되지 않는 특허도 날짜/출원인 필터 검색에 포함되도록 한 번 실행합니다.
+    """
+    updated = 0
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids, metadatas = [], []
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            if DATE_FIELD not in metadata or APPLICANT_FIELD not in metadata:
+                ids.append(chunk_id)
+                metadatas.append(dict(metadata, **filter_fields(metadata)))
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += len(page["ids"])
+    if updated:
+        mark_collection_changed(db_path, collection.name)
+    print(f"검색 필터 필드 보강 완료: 청크 {updated}개 갱신")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="특허 CSV 를 ChromaDB 컬렉션으로 적재합니다.")
+    parser.add_argument("csv_path", nargs="?")
+    parser.add_argument("--backfill-filters", action="store_true",
+                        help="기존 컬렉션에 검색 필터용 정규화 필드만 채우고 종료합니다 (이후 BM25/벡터 색인도 다시 만드세요).")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--chunksize", type=int, default=CSV_CHUNK_SIZE)
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--state-path", default=INGEST_STATE_PATH)
+    parser.add_argument("--no-resume", action="store_true", help="체크포인트를 무시하고 처음부터 읽습니다.")
+    parser.add_argument("--bm25-path", default=DEFAULT_BM25_PATH, help="BM25 역색인 저장 경로")
+    parser.add_argument("--vector-index-path", help="지정하면 mmap 양자화 벡터 색인도 내보냄 (예: ./patent_vector_index)")
+    parser.add_argument("--vector-dtype", choices=["int8", "float16"], default=VECTOR_INDEX_DTYPE)
+    parser.add_argument("--ivf-lists", type=int, default=0, help="벡터 색인 IVF 목록 수 (0 이면 전수 검색)")
+    args = parser.parse_args()
+
+    if args.backfill_filters:
+        client = chromadb.PersistentClient(path=args.db_path)
+        backfill_filter_fields(client.get_collection(args.collection), db_path=args.db_path)
+        raise SystemExit(0)
+    if not args.csv_path:
+        parser.error("csv_path 가 필요합니다.")
+
+    process_patents_to_chroma(
+        args.csv_path,
+        db_path=args.db_path,
+        collection_name=args.collection,
+        model_name=args.model,
+        chunksize=args.chunksize,
+        embed_batch_size=args.embed_batch_size,
+        state_path=args.state_path,
+        resume=not args.no_resume,
+        lexical_index_path=args.bm25_path,
+        vector_index_path=args.vector_index_path,
+        vector_dtype=args.vector_dtype,
+        ivf_lists=args.ivf_lists,
+    )
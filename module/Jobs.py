@@ -0,0 +1,123 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .Metrics import logger, metrics, bind_context, get_request_id
+
+# 비동기 분석 작업 설정
+JOB_WORKERS = 4               # 동시에 실행할 파이프라인 수
+JOB_QUEUE_LIMIT = 32          # 실행 대기 중인 작업 최대 수 (초과 시 즉시 거절)
+JOB_RESULT_TTL = 15 * 60      # 완료된 작업 결과 보관 시간(초)
+
+
+class QueueFullError(Exception):
+    """작업 대기열이 가득 차 새 작업을 받을 수 없을 때 발생합니다."""
+
+
+class Job:
+    def __init__(self, job_id, request_id):
+        self.id = job_id
+        self.request_id = request_id
+        self.status = "queued"        # queued -> running -> succeeded | failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.partial = {}
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "partial": self.partial if self.status in ("queued", "running") else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    제한된 워커 풀과 대기열로 오래 걸리는 작업을 요청 스레드 밖에서 실행합니다.
+
+    - submit: 대기열이 가득 차면 QueueFullError 를 즉시 발생시킵니다 (HTTP 429 로 변환).
+    - 작업 함수는 func(*args, report=콜백) 형태로 호출되며, report(dict) 로 중간 결과를 갱신할 수 있습니다.
+    - 완료된 작업은 result_ttl 초가 지나면 조회 시점에 삭제됩니다.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT, result_ttl=JOB_RESULT_TTL):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="idea-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+
+    def submit(self, func, *args):
+        with self._lock:
+            self._expire()
+            if self._queued >= self.queue_limit:
+                metrics.inc("llm_rag_jobs_rejected_total", help_text="Jobs rejected because the queue was full.")
+                raise QueueFullError(f"job queue is full ({self._queued}/{self.queue_limit})")
+            job = Job(uuid.uuid4().hex, get_request_id())
+            self._jobs[job.id] = job
+            self._queued += 1
+        metrics.inc("llm_rag_jobs_submitted_total", help_text="Jobs accepted into the queue.")
+        self._executor.submit(bind_context(self._run), job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        with self._lock:
+            self._queued -= 1
+            job.status = "running"
+            job.started_at = time.time()
+
+        def report(partial):
+            with self._lock:
+                job.partial = dict(partial)
+
+        try:
+            result = func(*args, report=report)
+            with self._lock:
+                job.result = result
+                job.status = "succeeded"
+        except Exception as e:
+            logger.exception("[작업 실패] %s: %s", job.id, e)
+            with self._lock:
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+            metrics.inc("llm_rag_jobs_finished_total", {"status": job.status}, help_text="Finished jobs by final status.")
+            metrics.observe("llm_rag_job_queue_wait_seconds", job.started_at - job.created_at,
+                            help_text="Time jobs spent waiting for a worker.")
+
+    def get(self, job_id):
+        """작업 상태 dict 를 반환합니다. 없거나 만료된 작업이면 None 입니다."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {"queued": self._queued, "running": running, "tracked": len(self._jobs)}
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,231 @@
+import time
+import random
+import threading
+
+import httpx
+import openai
+from openai import OpenAI
+
+from .Metrics import logger, metrics
+
+# Gemini 할당량에 맞춘 호출 제한 설정
+LLM_REQUESTS_PER_MINUTE = 900   # 토큰 버킷 보충 속도 (분당 요청 수)
+LLM_BURST = 30                  # 토큰 버킷 용량 (순간 최대 요청 수)
+LLM_MAX_CONCURRENCY = 16        # 동시 호출 상한 (429 가 나면 자동으로 줄었다가 성공 시 다시 늘어남)
+LLM_MIN_CONCURRENCY = 1
+
+# 재시도/시간 제한 설정
+LLM_MAX_RETRIES = 4             # 429, 5xx, 연결 오류 시 최대 재시도 횟수
+LLM_BACKOFF_BASE = 0.5          # 지수 백오프 시작 대기 시간(초)
+LLM_BACKOFF_MAX = 20.0          # 한 번에 기다리는 최대 시간(초)
+LLM_REQUEST_TIMEOUT = 60.0      # HTTP 요청 1회의 시간 제한(초)
+LLM_CALL_DEADLINE = 120.0       # 재시도와 대기를 포함한 호출 전체의 시간 제한(초)
+
+# HTTP 연결 풀 설정
+LLM_MAX_CONNECTIONS = 32
+LLM_MAX_KEEPALIVE = 16
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """대기와 재시도를 포함한 LLM 호출 시간 제한을 넘겼을 때 발생합니다."""
+
+
+class TokenBucket:
+    """초당 rate 개씩 채워지고 최대 capacity 개까지 쌓이는 토큰 버킷."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """토큰 하나를 얻을 때까지 기다립니다. deadline(time.monotonic 기준)까지 못 얻으면 False."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 방식의 동시 호출 제한.
+    429 를 받으면 한도를 절반으로 줄이고, 성공할 때마다 1/한도 씩 늘려 천천히 원래 한도로 돌아갑니다.
+    """
+
+    def __init__(self, maximum, minimum=LLM_MIN_CONCURRENCY):
+        self.maximum = maximum
+        self.minimum = minimum
+        self._limit = float(maximum)
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self, deadline=None):
+        with self._cond:
+            while self._active >= int(self._limit):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return False
+                self._cond.wait(timeout)
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            if self._limit < self.maximum:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+                self._cond.notify()
+
+    def on_throttle(self):
+        with self._cond:
+            previous = int(self._limit)
+            self._limit = max(self.minimum, self._limit / 2)
+            if int(self._limit) < previous:
+                logger.warning("[LLM] 429 응답으로 동시 호출 한도 축소: %d -> %d", previous, int(self._limit))
+
+
+def _retry_reason(error):
+    """
+    재시도할 오류면 사유 문자열을, 아니면 None 을 반환합니다.
+    OpenAI SDK 오류 외에 HTTP 상태 코드를 code 속성으로 갖는 google.api_core 오류(임베딩 호출)도 판별합니다.
+    """
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    if isinstance(error, openai.APIStatusError):
+        return "server_error" if error.status_code >= 500 else None
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        if code == 429:
+            return "rate_limit"
+        if code == 504:
+            return "timeout"
+        if code >= 500:
+            return "server_error"
+        return None
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    if isinstance(error, ConnectionError):
+        return "connection"
+    return None
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedLLMClient:
+    """
+    OpenAI 호환 클라이언트를 감싸 라우터/평가자/요약기가 함께 쓰는 호출 계층.
+
+    client.chat.completions.create(...) 와 같은 방식으로 호출하며, 호출마다
+    토큰 버킷 대기 -> 동시 호출 슬롯 확보 -> 요청 -> (429/5xx/연결 오류 시) 지터를 넣은 지수 백오프 후 재시도
+    순으로 처리합니다. 모든 대기와 재시도는 deadline 초 안에서만 이루어집니다.
+    stream=True 호출은 스트림이 열릴 때까지만 재시도하고, 슬롯은 스트림을 연 직후 반환합니다.
+    OpenAI 호환 API 가 아닌 호출(예: 배치 임베딩)은 call(request) 로 같은 제한과 재시도를 적용합니다 (client 는 None 이어도 됨).
+    """
+
+    def __init__(self, client, requests_per_minute=LLM_REQUESTS_PER_MINUTE, burst=LLM_BURST,
+                 max_concurrency=LLM_MAX_CONCURRENCY, max_retries=LLM_MAX_RETRIES, deadline=LLM_CALL_DEADLINE,
+                 request_timeout=LLM_REQUEST_TIMEOUT, backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX):
+        self.client = client
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.request_timeout = request_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.chat = _Chat(self)
+
+    def create(self, **request):
+        return self.call(lambda timeout: self.client.chat.completions.create(timeout=timeout, **request))
+
+    def call(self, request):
+        """request(timeout) 를 호출 제한과 재시도 안에서 실행합니다. timeout 은 이번 시도에 남은 시간(초)입니다."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(deadline):
+                raise LLMDeadlineExceeded("rate limiter wait exceeded the call deadline")
+            if not self.concurrency.acquire(deadline):
+                raise LLMDeadlineExceeded("concurrency slot wait exceeded the call deadline")
+            try:
+                timeout = min(self.request_timeout, deadline - time.monotonic())
+                response = request(max(timeout, 0.001))
+            except Exception as e:
+                reason = _retry_reason(e)
+                if reason == "rate_limit":
+                    self.concurrency.on_throttle()
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                error = e
+            else:
+                self.concurrency.on_success()
+                return response
+            finally:
+                self.concurrency.release()
+
+            delay = _retry_after(error)
+            if delay is None:
+                # full jitter: 0 ~ base * 2^attempt 사이에서 무작위로 대기
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if time.monotonic() + delay > deadline:
+                raise LLMDeadlineExceeded(f"retry after {reason} would exceed the call deadline") from error
+            attempt += 1
+            metrics.inc("llm_rag_llm_retries_total", {"reason": reason}, help_text="LLM calls retried by reason.")
+            logger.warning("[LLM] %s -> %.2fs 후 재시도 (%d/%d)", reason, delay, attempt, self.max_retries)
+            time.sleep(delay)
+
+
+class _Completions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, **request):
+        return self._owner.create(**request)
+
+
+class _Chat:
+    def __init__(self, owner):
+        self.completions = _Completions(owner)
+
+
+def build_llm_client(base_url, api_key, **options):
+    """
+    연결 풀을 공유하는 OpenAI 호환 클라이언트를 만들고 RateLimitedLLMClient 로 감싸 반환합니다.
+    재시도는 이 계층에서 처리하므로 SDK 자체 재시도는 끕니다.
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=10.0),
+    )
+    client = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+    return RateLimitedLLMClient(client, **options)
@@ -0,0 +1,334 @@
+import os
+import json
+import math
+import array
+import shutil
+import numpy as np
+from collections import Counter
+
+from .Rerank import char_ngrams
+from .Filters import filter_fields, DATE_FIELD, APPLICANT_FIELD
+from .Metrics import logger
+
+DEFAULT_BM25_PATH = "./patent_bm25_index"
+BM25_NGRAM = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 역색인 생성 시 posting 을 메모리에 모아 term 순으로 정렬한 뒤 run 파일로 내보내는 문서 수
+BM25_RUN_DOCS = 20_000
+# 증분 갱신용 delta 세그먼트가 본 세그먼트 문서 수의 이 비율을 넘으면 전체를 다시 만듦
+LEXICAL_DELTA_MAX_FRACTION = 0.05
+DELTA_DIR = "delta"
+
+_TF_MAX = np.iinfo(np.uint16).max
+
+
+class BM25Index:
+    """
+    Chroma 컬렉션과 같은 청크들에 대한 문자 n-gram BM25 역색인.
+
+    디스크에는 CSR 형태의 NumPy 배열로 저장되고 mmap 으로 읽으므로, 로드가 빠르고 여러 프로세스가 페이지를 공유합니다.
+      - vocab.json: n-gram -> term id
+      - ids.json: 문서 번호 -> Chroma 청크 id
+      - offsets.npy (int64): term id 별 posting 구간 시작 위치
+      - postings_doc.npy (int32), postings_tf.npy (uint16): posting 목록
+      - doc_len.npy (int32): 문서별 n-gram 수
+      - doc_dates.npy (int32), doc_applicants.npy (int32), applicants.json: 검색 필터용 문서별 출원일과 출원인 코드
+      - deleted.npy (bool), delta/: 증분 갱신분. 바뀌거나 삭제된 본 세그먼트 문서 표시와, 바뀐 청크만으로 만든 작은 역색인
+    """
+
+    def __init__(self, vocab, ids, offsets, postings_doc, postings_tf, doc_len, ngram=BM25_NGRAM, k1=BM25_K1, b=BM25_B,
+                 doc_dates=None, doc_applicants=None, applicant_vocab=None, deleted=None, delta=None):
+        self.vocab = vocab
+        self.ids = ids
+        self.offsets = offsets
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.doc_len = doc_len
+        self.ngram = ngram
+        self.k1 = k1
+        self.b = b
+        self.doc_dates = doc_dates
+        self.doc_applicants = doc_applicants
+        self.applicant_vocab = applicant_vocab
+        self.deleted = deleted
+        self.delta = delta
+        self._filter_warned = False
+
+        segments = self._segments()
+        self.n_rows = sum(len(segment.ids) for segment, _ in segments)
+        self.n_live = self.n_rows - (int(np.count_nonzero(deleted)) if deleted is not None else 0)
+        total_len = sum(float(np.sum(segment.doc_len, dtype=np.int64)) for segment, _ in segments)
+        self.avgdl = total_len / self.n_rows if self.n_rows else 0.0
+
+    def __len__(self):
+        return self.n_live
+
+    def _segments(self):
+        """(세그먼트, 전체 행 번호에서의 시작 위치) 목록. 행 번호는 본 세그먼트 다음에 delta 가 이어집니다."""
+        segments = [(self, 0)]
+        if self.delta is not None:
+            segments.append((self.delta, len(self.ids)))
+        return segments
+
+    def chunk_id(self, row):
+        if row < len(self.ids):
+            return self.ids[row]
+        return self.delta.ids[row - len(self.ids)]
+
+    @classmethod
+    def load(cls, path=DEFAULT_BM25_PATH, with_delta=True):
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as f:
+            ids = json.load(f)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("offsets", "postings_doc", "postings_tf", "doc_len")
+        }
+        doc_dates = doc_applicants = applicant_vocab = None
+        if os.path.exists(os.path.join(path, "applicants.json")):
+            doc_dates = np.load(os.path.join(path, "doc_dates.npy"), mmap_mode="r")
+            doc_applicants = np.load(os.path.join(path, "doc_applicants.npy"), mmap_mode="r")
+            with open(os.path.join(path, "applicants.json"), encoding="utf-8") as f:
+                applicant_vocab = json.load(f)
+        deleted = delta = None
+        if with_delta and os.path.exists(os.path.join(path, "deleted.npy")):
+            deleted = np.load(os.path.join(path, "deleted.npy"), mmap_mode="r")
+        if with_delta and os.path.isdir(os.path.join(path, DELTA_DIR)):
+            delta = cls.load(os.path.join(path, DELTA_DIR), with_delta=False)
+        return cls(vocab, ids, arrays["offsets"], arrays["postings_doc"], arrays["postings_tf"], arrays["doc_len"],
+                   ngram=meta["ngram"], k1=meta["k1"], b=meta["b"],
+                   doc_dates=doc_dates, doc_applicants=doc_applicants, applicant_vocab=applicant_vocab,
+                   deleted=deleted, delta=delta)
+
+    def filter_mask(self, search_filter):
+        """
+        SearchFilter 를 만족하는 행(본 세그먼트 + delta)의 bool 마스크. 조건이 없으면 None 입니다.
+        필터 정보 없이 만든 이전 역색인이면 조건을 확인할 수 없으므로 모든 문서를 제외하고, 다시 만들라는 경고를 한 번 남깁니다.
+        """
+        if not search_filter:
+            return None
+        masks = []
+        for segment, _ in self._segments():
+            if segment.doc_dates is None:
+                if not self._filter_warned:
+                    logger.warning("BM25 역색인에 검색 필터 필드가 없어 필터 검색에서 역색인 결과가 비어 있습니다. "
+                                   "build_lexical_index 로 다시 만드세요.")
+                    self._filter_warned = True
+                masks.append(np.zeros(len(segment.ids), dtype=bool))
+            else:
+                masks.append(search_filter.mask(segment.doc_dates, segment.doc_applicants, segment.applicant_vocab))
+        return np.concatenate(masks) if len(masks) > 1 else masks[0]
+
+    def search(self, query_text, top_k=20, mask=None):
+        """
+        BM25 점수 상위 top_k 개의 (청크 id, 점수) 를 점수 내림차순으로 반환합니다.
+        mask(filter_mask 와 같은 행 순서의 bool 배열)를 주면 True 인 문서만 후보로 삼습니다.
+        df 는 세그먼트별 posting 수의 합이므로 삭제 표시된 문서도 포함하는 근사치이며, 전체 재구축 시 정확해집니다.
+        """
+        if not self.n_live:
+            return []
+        segments = self._segments()
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        for term in set(char_ngrams(query_text, self.ngram)):
+            ranges = []
+            for segment, base in segments:
+                term_id = segment.vocab.get(term)
+                if term_id is not None:
+                    ranges.append((segment, base, segment.offsets[term_id], segment.offsets[term_id + 1]))
+            df = sum(end - start for _, _, start, end in ranges)
+            if not df:
+                continue
+            idf = math.log(1 + (max(self.n_live - df, 0) + 0.5) / (df + 0.5))
+            for segment, base, start, end in ranges:
+                docs = segment.postings_doc[start:end]
+                tfs = segment.postings_tf[start:end].astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * segment.doc_len[docs] / self.avgdl)
+                scores[base + docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        if self.deleted is not None:
+            scores[:len(self.ids)][self.deleted] = 0
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.chunk_id(i), float(scores[i])) for i in candidates]
+
+
+def _replace_dir(tmp_path, path):
+    old_path = path.rstrip("/") + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def write_bm25_index(pages, path=DEFAULT_BM25_PATH, ngram=BM25_NGRAM, k1=BM25_K1, b=BM25_B):
+    """
+    (ids, documents, metadatas) 페이지들을 차례로 읽어 BM25 역색인을 path 에 씁니다.
+
+    문서 본문과 posting 을 한꺼번에 메모리에 두지 않도록, BM25_RUN_DOCS 개 문서마다 posting 을 NumPy 배열로 만들어
+    term 순으로 정렬한 run 파일로 내보냅니다. 마지막에 term 별 posting 수로 위치를 계산해 run 들을 디스크 상의
+    postings 배열에 순서대로 흩어 씁니다 (counting sort). 임시 디렉터리에 모두 쓴 뒤 교체하므로 생성 중에도 기존 역색인으로 검색할 수 있습니다.
+    반환값: 문서 수
+    """
+    tmp_path = path.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    run_path = os.path.join(tmp_path, "runs")
+    os.makedirs(run_path)
+
+    vocab, ids, applicant_codes, runs = {}, [], {}, []
+    doc_len, doc_dates, doc_applicants = array.array("i"), array.array("i"), array.array("i")
+    term_counts = np.zeros(0, dtype=np.int64)
+    run_terms, run_tfs, run_unique = array.array("i"), array.array("H"), array.array("i")
+
+    def flush():
+        nonlocal term_counts, run_terms, run_tfs, run_unique
+        if not len(run_unique):
+            return
+        first_doc = len(ids) - len(run_unique)
+        terms = np.frombuffer(run_terms, dtype=np.int32)
+        docs = np.repeat(np.arange(first_doc, len(ids), dtype=np.int32), np.frombuffer(run_unique, dtype=np.int32))
+        order = np.argsort(terms, kind="stable")
+        run_file = os.path.join(run_path, f"run_{len(runs)}.npz")
+        np.savez(run_file, terms=terms[order], docs=docs[order], tfs=np.frombuffer(run_tfs, dtype=np.uint16)[order])
+        runs.append(run_file)
+
+        counts = np.bincount(terms, minlength=len(vocab))
+        counts[:len(term_counts)] += term_counts
+        term_counts = counts
+        run_terms, run_tfs, run_unique = array.array("i"), array.array("H"), array.array("i")
+
+    for page_ids, documents, metadatas in pages:
+        for chunk_id, document, metadata in zip(page_ids, documents, metadatas or [None] * len(page_ids)):
+            counts = Counter(char_ngrams(document, ngram))
+            ids.append(chunk_id)
+            doc_len.append(sum(counts.values()))
+            run_unique.append(len(counts))
+            for term, tf in counts.items():
+                run_terms.append(vocab.setdefault(term, len(vocab)))
+                run_tfs.append(min(tf, _TF_MAX))
+
+            metadata = metadata or {}
+            if DATE_FIELD not in metadata or APPLICANT_FIELD not in metadata:
+                metadata = filter_fields(metadata)
+            doc_dates.append(int(metadata[DATE_FIELD]))
+            doc_applicants.append(applicant_codes.setdefault(metadata[APPLICANT_FIELD], len(applicant_codes)))
+            if len(run_unique) >= BM25_RUN_DOCS:
+                flush()
+    flush()
+
+    # term 별 posting 구간을 정하고, run 들을 문서 순서대로 흩어 써서 각 구간이 문서 번호 오름차순이 되게 함
+    term_counts = np.concatenate([term_counts, np.zeros(len(vocab) - len(term_counts), dtype=np.int64)])
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(term_counts)
+    total = int(offsets[-1])
+    if total:
+        postings_doc = np.lib.format.open_memmap(os.path.join(tmp_path, "postings_doc.npy"), mode="w+",
+                                                 dtype=np.int32, shape=(total,))
+        postings_tf = np.lib.format.open_memmap(os.path.join(tmp_path, "postings_tf.npy"), mode="w+",
+                                                dtype=np.uint16, shape=(total,))
+        cursor = offsets[:-1].copy()
+        for run_file in runs:
+            with np.load(run_file) as run:
+                terms, docs, tfs = run["terms"], run["docs"], run["tfs"]
+            run_counts = np.bincount(terms, minlength=len(vocab))
+            run_starts = np.cumsum(run_counts) - run_counts
+            positions = cursor[terms] + np.arange(len(terms)) - run_starts[terms]
+            postings_doc[positions] = docs
+            postings_tf[positions] = tfs
+            cursor += run_counts
+        postings_doc.flush(), postings_tf.flush()
+        del postings_doc, postings_tf
+    else:
+        np.save(os.path.join(tmp_path, "postings_doc.npy"), np.empty(0, dtype=np.int32))
+        np.save(os.path.join(tmp_path, "postings_tf.npy"), np.empty(0, dtype=np.uint16))
+    shutil.rmtree(run_path)
+
+    with open(os.path.join(tmp_path, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(os.path.join(tmp_path, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f, ensure_ascii=False)
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"ngram": ngram, "k1": k1, "b": b}, f)
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "doc_len.npy"), np.frombuffer(doc_len, dtype=np.int32))
+    np.save(os.path.join(tmp_path, "doc_dates.npy"), np.frombuffer(doc_dates, dtype=np.int32))
+    np.save(os.path.join(tmp_path, "doc_applicants.npy"), np.frombuffer(doc_applicants, dtype=np.int32))
+    with open(os.path.join(tmp_path, "applicants.json"), "w", encoding="utf-8") as f:
+        json.dump(list(applicant_codes), f, ensure_ascii=False)
+
+    _replace_dir(tmp_path, path)
+    return len(ids)
+
+
+def _collection_pages(collection, page_size):
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        yield page["ids"], page["documents"], page["metadatas"]
+        offset += len(page["ids"])
+
+
+def build_lexical_index(collection, path=DEFAULT_BM25_PATH, page_size=5000):
+    """Chroma 컬렉션의 모든 청크를 페이지 단위로 읽어 BM25 역색인을 새로 만들고 저장합니다 (delta 세그먼트도 합쳐짐)."""
+    n_docs = write_bm25_index(_collection_pages(collection, page_size), path)
+    index = BM25Index.load(path)
+    print(f"BM25 역색인 생성 완료: 청크 {n_docs}개, n-gram {len(index.vocab)}개 -> {path}")
+    return index
+
+
+def update_lexical_index(collection, changed_ids, deleted_ids, path=DEFAULT_BM25_PATH, page_size=5000):
+    """
+    증분 적재로 바뀐 청크만 BM25 역색인에 반영합니다.
+
+    본 세그먼트에서 바뀌거나 삭제된 청크는 deleted.npy 에 표시하고, 바뀐 청크와 기존 delta 의 나머지 청크로
+    delta 세그먼트만 다시 만듭니다. delta 가 본 세그먼트 문서 수의 LEXICAL_DELTA_MAX_FRACTION 을 넘으면 전체를 다시 만듭니다.
+    """
+    index = BM25Index.load(path)
+    touched = set(changed_ids) | set(deleted_ids)
+    delta_ids = [chunk_id for chunk_id in (index.delta.ids if index.delta is not None else []) if chunk_id not in touched]
+    delta_ids = list(dict.fromkeys(delta_ids + list(changed_ids)))
+    if len(delta_ids) > LEXICAL_DELTA_MAX_FRACTION * len(index.ids):
+        return build_lexical_index(collection, path, page_size)
+
+    deleted = np.zeros(len(index.ids), dtype=bool) if index.deleted is None else np.array(index.deleted)
+    rows = {chunk_id: row for row, chunk_id in enumerate(index.ids)}
+    deleted[[rows[chunk_id] for chunk_id in touched if chunk_id in rows]] = True
+
+    def pages():
+        for start in range(0, len(delta_ids), page_size):
+            page = collection.get(ids=delta_ids[start:start + page_size], include=["documents", "metadatas"])
+            yield page["ids"], page["documents"], page["metadatas"]
+
+    write_bm25_index(pages(), os.path.join(path, DELTA_DIR), index.ngram, index.k1, index.b)
+    tmp_file = os.path.join(path, "deleted.tmp.npy")
+    np.save(tmp_file, deleted)
+    os.replace(tmp_file, os.path.join(path, "deleted.npy"))
+
+    index = BM25Index.load(path)
+    print(f"BM25 역색인 증분 갱신 완료: 본 세그먼트 삭제 표시 {int(deleted.sum())}개, delta 청크 {len(index.delta.ids)}개 -> {path}")
+    return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    여러 순위 목록(청크 id 리스트)을 Reciprocal Rank Fusion 으로 합칩니다.
+    반환값: [(청크 id, RRF 점수), ...] (점수 내림차순)
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,186 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger("llm_rag")
+
+# 프롬프트, 청크 본문, LLM 응답 전문 같은 대용량 로그는 LLM_RAG_DEBUG=1 일 때만 남김
+DEBUG_PAYLOADS = os.environ.get("LLM_RAG_DEBUG", "").lower() in ("1", "true", "yes")
+
+# 단계별 소요 시간 히스토그램 버킷(초)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+
+
+def new_request_id(request_id=None):
+    """현재 컨텍스트에 요청 상관관계 ID 를 설정하고 반환합니다. (None 이면 새로 생성)"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def bind_context(func):
+    """
+    현재 contextvars(요청 ID 포함)를 그대로 가지고 실행되는 함수로 감쌉니다.
+    ThreadPoolExecutor 로 넘기는 작업은 컨텍스트를 상속하지 않으므로 submit 전에 감싸야 합니다.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+class RequestIdFilter(logging.Filter):
+    """로그 레코드에 request_id 필드를 채워 포맷 문자열에서 %(request_id)s 로 쓸 수 있게 합니다."""
+
+    def filter(self, record):
+        record.request_id = get_request_id()
+        return True
+
+
+def configure_logging(level=logging.INFO):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    handler.addFilter(RequestIdFilter())
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.DEBUG if DEBUG_PAYLOADS else level)
+    logger.propagate = False
+
+
+def log_payload(label, text, limit=None):
+    """디버그 플래그가 켜진 경우에만 대용량 페이로드를 로그로 남깁니다."""
+    if DEBUG_PAYLOADS:
+        text = "" if text is None else str(text)
+        logger.debug("%s: %s", label, text[:limit] if limit else text)
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+class MetricsRegistry:
+    """Prometheus 텍스트 형식으로 내보낼 수 있는 최소한의 카운터/히스토그램 저장소."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def inc(self, name, labels=None, value=1.0, help_text=None):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0.0) + value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def observe(self, name, value, labels=None, help_text=None):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        escaped = ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in pairs)
+        return "{" + escaped + "}"
+
+    def render(self):
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: dict(v, buckets=list(v["buckets"])) for k, v in series.items()}
+                          for name, series in self._histograms.items()}
+            help_texts = dict(self._help)
+
+        lines = []
+        for name in sorted(counters):
+            if name in help_texts:
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{self._format_labels(key)} {value:g}")
+        for name in sorted(histograms):
+            if name in help_texts:
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, entry in sorted(histograms[name].items()):
+                for bound, count in zip(self.buckets, entry["buckets"]):
+                    lines.append(f"{name}_bucket{self._format_labels(key, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{name}_bucket{self._format_labels(key, [('le', '+Inf')])} {entry['count']}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {entry['sum']:g}")
+                lines.append(f"{name}_count{self._format_labels(key)} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def span(stage, **labels):
+    """
+    파이프라인 단계 하나의 소요 시간을 기록합니다.
+    예외가 발생하면 단계별 오류 카운터를 올리고 예외는 그대로 전달합니다.
+    """
+    labels = dict(labels, stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.inc("llm_rag_stage_errors_total", labels, help_text="Errors raised per pipeline stage.")
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("llm_rag_stage_duration_seconds", elapsed, labels, help_text="Pipeline stage latency in seconds.")
+        logger.debug("stage=%s elapsed=%.3fs", stage, elapsed)
+
+
+def record_error(stage):
+    """예외로 전파되지 않고 내부에서 처리된 오류를 기록합니다."""
+    metrics.inc("llm_rag_stage_errors_total", {"stage": stage}, help_text="Errors raised per pipeline stage.")
+
+
+def record_usage(stage, response):
+    """OpenAI 호환 응답의 usage 에서 토큰 사용량을 읽어 카운터에 더합니다."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            metrics.inc("llm_rag_llm_tokens_total", {"stage": stage, "type": kind.split("_")[0]}, value,
+                        help_text="LLM tokens consumed per pipeline stage.")
+    metrics.inc("llm_rag_llm_calls_total", {"stage": stage}, help_text="LLM API calls per pipeline stage.")
+
+
+def record_cache(cache, hit):
+    metrics.inc("llm_rag_cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"},
+                help_text="Cache lookups by cache and result.")
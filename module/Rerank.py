@@ -0,0 +1,91 @@
+import re
+import unicodedata
+
+from .Metrics import logger, metrics
+
+# LLM 평가 전 후보 선별(리랭킹) 설정
+RERANK_ENABLED = True
+RERANK_MAX_DISTANCE = 0.75   # 이보다 코사인 거리가 먼 후보는 제외
+RERANK_MIN_CANDIDATES = 3    # 거리 조건과 무관하게 항상 남길 최소 후보 수
+RERANK_MAX_CANDIDATES = 10   # LLM 평가로 보낼 최대 후보 수
+RERANK_GAP_THRESHOLD = 0.08  # 인접 후보 간 거리 차이가 이 값 이상이면 그 지점에서 자름 (adaptive top-k)
+RERANK_LEXICAL_WEIGHT = 0.3  # 최종 점수에서 어휘 겹침 점수의 비중
+
+_WORD = re.compile(r"\w+")
+
+
+def char_ngrams(text, n=2):
+    """
+    한국어 형태소 분석기 없이 쓸 수 있는 문자 n-gram 토큰화.
+    단어(\\w+) 단위로 나눈 뒤 각 단어 안에서 n-gram 을 만들며, n 보다 짧은 단어는 그대로 사용합니다.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    grams = []
+    for word in _WORD.findall(text):
+        if len(word) <= n:
+            grams.append(word)
+        else:
+            grams.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+def lexical_overlap(query_text, document, n=2):
+    """쿼리의 문자 n-gram 중 문서에 등장하는 비율 (0~1)."""
+    query_grams = set(char_ngrams(query_text, n))
+    if not query_grams:
+        return 0.0
+    return len(query_grams & set(char_ngrams(document, n))) / len(query_grams)
+
+
+def _adaptive_cutoff(distances, min_candidates, max_candidates, gap_threshold):
+    """거리순으로 정렬된 후보에서, min~max 범위 안의 가장 큰 거리 간격이 gap_threshold 이상이면 그 위치를 반환합니다."""
+    limit = min(len(distances), max_candidates)
+    best_gap, cutoff = 0.0, limit
+    for i in range(max(1, min_candidates), limit):
+        gap = distances[i] - distances[i - 1]
+        if gap > best_gap:
+            best_gap, cutoff = gap, i
+    return cutoff if best_gap >= gap_threshold else limit
+
+
+def prune_candidates(query_text, candidates, max_distance=RERANK_MAX_DISTANCE, min_candidates=RERANK_MIN_CANDIDATES,
+                     max_candidates=RERANK_MAX_CANDIDATES, gap_threshold=RERANK_GAP_THRESHOLD,
+                     lexical_weight=RERANK_LEXICAL_WEIGHT):
+    """
+    get_unique_patents 결과에서 LLM 평가로 보낼 유망한 후보만 남깁니다.
+
+    1. 거리 컷오프: distance 가 max_distance 보다 큰 후보 제외 (단, 상위 min_candidates 개는 유지)
+    2. adaptive top-k: 거리 간격이 크게 벌어지는 지점 이후의 후보 제외
+    3. 어휘 점수: 쿼리와 청크의 문자 n-gram 겹침을 벡터 유사도와 섞어 재정렬
+
+    하이브리드 검색 결과(rrf_score 가 있음)는 BM25 로만 찾은 후보의 벡터 거리가 멀 수 있으므로
+    1, 2 단계 대신 RRF 순위 상위 max_candidates 개를 남기고, 벡터 유사도 대신 (최고 점수로 나눈) RRF 점수를 섞습니다.
+
+    각 후보에는 "lexical_score", "rerank_score" 가 추가되며, rerank_score 내림차순으로 반환합니다.
+    """
+    if not candidates:
+        return candidates
+
+    fused = all(item.get('rrf_score') is not None for item in candidates)
+    if fused:
+        kept = sorted(candidates, key=lambda item: item['rrf_score'], reverse=True)[:max_candidates]
+        top_rrf = kept[0]['rrf_score'] or 1.0
+    else:
+        ordered = sorted(candidates, key=lambda item: item['distance'])
+        kept = [
+            item for i, item in enumerate(ordered)
+            if i < min_candidates or max_distance is None or item['distance'] <= max_distance
+        ]
+        kept = kept[:_adaptive_cutoff([item['distance'] for item in kept], min_candidates, max_candidates, gap_threshold)]
+
+    for item in kept:
+        lexical = lexical_overlap(query_text, item['document'])
+        relevance = item['rrf_score'] / top_rrf if fused else 1 - item['distance']
+        item['lexical_score'] = lexical
+        item['rerank_score'] = (1 - lexical_weight) * relevance + lexical_weight * lexical
+    kept.sort(key=lambda item: item['rerank_score'], reverse=True)
+
+    dropped = len(candidates) - len(kept)
+    logger.info("[리랭킹] 후보 %d개 중 %d개 제외, %d개를 평가로 전달", len(candidates), dropped, len(kept))
+    metrics.inc("llm_rag_rerank_dropped_total", value=dropped, help_text="Candidates dropped before LLM evaluation.")
+    return kept
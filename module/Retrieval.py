@@ -1,117 +1,629 @@
-import pandas as pd
 import chromadb
+import numpy as np
 import os
-import csv
-from chromadb.utils import embedding_functions
+import time
+import array
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from .Lexical import BM25Index, DEFAULT_BM25_PATH, reciprocal_rank_fusion
+from .VectorIndex import QuantizedVectorIndex, DEFAULT_VECTOR_INDEX_PATH
+from .Filters import SearchFilter
+from .Embeddings import BatchEmbeddingFunction
+from .Metrics import logger, span, log_payload, record_cache
 
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 
-def get_unique_patents(results):
+DEFAULT_DB_PATH = "./patent_chroma_db"
+DEFAULT_COLLECTION_NAME = "patents"
+DEFAULT_EMBEDDING_MODEL = "gemini-embedding-001"
+
+# 벡터 검색 결과와 BM25 역색인 결과를 RRF 로 합칠지 여부 (역색인 파일이 없으면 벡터 검색만 사용)
+HYBRID_SEARCH_ENABLED = True
+
+# 벡터 검색 백엔드: "chroma" | "mmap" (module.VectorIndex 로 내보낸 양자화 색인, 색인 파일이 없으면 chroma 사용)
+SEARCH_BACKEND = "chroma"
+
+# unique_k 지정 시 서로 다른 특허 K개를 얻을 때까지 검색 범위를 두 배씩 늘리는 상한
+UNIQUE_FETCH_CAP = 320
+
+# 쿼리 임베딩 캐시 설정
+EMBEDDING_CACHE_PATH = "./embedding_cache.sqlite3"
+EMBEDDING_CACHE_MEMORY_SIZE = 1024           # 메모리 LRU 최대 항목 수
+EMBEDDING_CACHE_DISK_SIZE = 100_000          # 디스크 캐시 최대 항목 수
+EMBEDDING_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # 디스크 캐시 항목 유효 기간(초)
+
+
+def content_version_path(db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME):
+    """적재 스크립트가 컬렉션 내용을 바꿀 때마다 갱신하는 표시 파일 경로 (Chroma DB 디렉터리 안)."""
+    return os.path.join(db_path, f"{collection_name}.content_version")
+
+
+def mark_collection_changed(db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME):
+    """컬렉션 내용이 바뀌었음을 기록합니다. 실행 중인 서버는 표시 파일의 수정 시각으로 캐시를 무효화합니다."""
+    path = content_version_path(db_path, collection_name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{time.time()}\n")
+
+
+def normalize_query_text(text):
+    """캐시 키 생성을 위해 유니코드 정규화, 공백 정리, 소문자화를 수행합니다."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split()).lower()
+
+
+class EmbeddingCache:
+    """
+    쿼리 임베딩 2단 캐시: 메모리 LRU + SQLite 디스크 저장소.
+
+    키는 (임베딩 모델명, 정규화된 쿼리) 의 해시이며, 메모리는 항목 수 기준으로,
+    디스크는 항목 수와 저장 시각(max_age) 기준으로 제거합니다.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_size=EMBEDDING_CACHE_MEMORY_SIZE,
+                 disk_size=EMBEDDING_CACHE_DISK_SIZE, max_age=EMBEDDING_CACHE_MAX_AGE):
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.max_age = max_age
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, vector BLOB, created_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_created ON query_embeddings(created_at)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, text):
+        return hashlib.sha256(f"{model_name}\0{normalize_query_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name, text):
+        key = self.make_key(model_name, text)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and time.time() - entry[1] <= self.max_age:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                record_cache("embedding", True)
+                return list(entry[0])
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and time.time() - row[1] <= self.max_age:
+                    vector = array.array("f", row[0]).tolist()
+                    self._remember(key, vector, row[1])
+                    self.stats["disk_hits"] += 1
+                    record_cache("embedding", True)
+                    return vector
+
+            self.stats["misses"] += 1
+            record_cache("embedding", False)
+            return None
+
+    def put(self, model_name, text, vector):
+        key = self.make_key(model_name, text)
+        vector = [float(v) for v in vector]
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, vector, created_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                    (key, model_name, array.array("f", vector).tobytes(), created_at)
+                )
+                self._conn.commit()
+                self._puts_since_prune += 1
+                if self._puts_since_prune >= 100:
+                    self._prune_disk()
+
+    def _remember(self, key, vector, created_at):
+        self._memory[key] = (tuple(vector), created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        """유효 기간이 지난 항목과 최대 개수를 넘는 오래된 항목을 디스크에서 제거합니다."""
+        self._puts_since_prune = 0
+        self._conn.execute("DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.max_age,))
+        self._conn.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,)
+        )
+        self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM query_embeddings")
+                self._conn.commit()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """프로세스 공용 쿼리 임베딩 캐시를 반환합니다."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+def get_unique_patents(results, target_k=None):
     """
     ChromaDB 검색 결과에서 청구 번호(ApplicationNumber) 기준으로 중복을 제거하고,
-    각 특허별 가장 유사도가 높은(distance가 낮은) 청크만 남겨 상위 k개를 반환합니다.
+    각 특허별 가장 유사도가 높은(distance가 낮은) 청크만 남겨 상위 target_k개를 반환합니다.
+
+    청크별 루프 대신 NumPy 정렬 + np.unique 한 번으로 그룹화합니다.
+    하이브리드 검색 결과("rrf_scores" 포함)라면 특허 순위는 특허 내 가장 높은 RRF 점수를 따릅니다.
     """
-    
-    # 1. 중복 제거를 위한 딕셔너리 (Key: 청구번호, Value: 해당 특허의 베스트 청크 정보)
-    unique_patents = {}
-    
-    # 검색된 결과의 개수만큼 반복
-    num_results = len(results['documents'][0])
-    
-    for i in range(num_results):
-        # 정보 추출
-        metadata = results['metadatas'][0][i]
-        document = results['documents'][0][i]
-        distance = results['distances'][0][i] # 코사인 유사도 거리 (낮을수록 유사함)
-        
-        # 청구 번호 추출 (그룹화의 기준 Key)
-        app_number = metadata.get('ApplicationNumber')
-        
-        # 예외 처리: 청구 번호가 없는 경우 스킵 (데이터 무결성 체크)
-        if not app_number:
-            continue
-            
-        # 2. 그룹화 및 최적 청크 선별 로직
-        if app_number not in unique_patents:
-            # (A) 처음 발견된 특허라면 -> 딕셔너리에 저장
-            unique_patents[app_number] = {
-                "metadata": metadata,
-                "document": document,
-                "distance": distance
-            }
-        else:
-            # (B) 이미 발견된 특허라면 -> 더 유사한지(distance가 더 작은지) 비교
-            existing_distance = unique_patents[app_number]['distance']
-            
-            if distance < existing_distance:
-                # 현재 청크가 기존 청크보다 더 유사하다면 정보 갱신
-                unique_patents[app_number] = {
-                    "metadata": metadata,
-                    "document": document,
-                    "distance": distance
-                }
-    
-    # 3. 딕셔너리를 리스트로 변환
-    unique_list = list(unique_patents.values())
-    
-    # 4. 거리(distance) 기준으로 오름차순 정렬 (낮은게 1등)
-    unique_list.sort(key=lambda x: x['distance'])
-    
-    # 5. 사용자가 원하는 개수(target_k)만큼 자르기
-    #final_results = unique_list[:target_k]
-    final_results = unique_list
-    
+    metadatas = results['metadatas'][0]
+    documents = results['documents'][0]
+    distances = np.asarray(results['distances'][0], dtype=np.float64) # 코사인 유사도 거리 (낮을수록 유사함)
+    rrf_scores = results.get('rrf_scores')
+
+    # 1. 청구 번호 추출 (그룹화의 기준 Key). 청구 번호가 없는 청크는 제외 (데이터 무결성 체크)
+    app_numbers = np.array([(metadata or {}).get('ApplicationNumber') or "" for metadata in metadatas], dtype=object)
+    valid = np.flatnonzero(app_numbers != "")
+    if not len(valid):
+        return []
+
+    # 2. distance 오름차순으로 정렬한 뒤 특허별 첫 등장 위치 = 해당 특허의 베스트 청크
+    by_distance = valid[np.argsort(distances[valid], kind="stable")]
+    _, first = np.unique(app_numbers[by_distance], return_index=True)
+    best = by_distance[first]
+
+    # 3. 특허 정렬: 거리 오름차순 (낮은게 1등), 하이브리드 검색이면 RRF 점수 내림차순
+    patent_rrf = None
+    if rrf_scores:
+        rrf = np.asarray(rrf_scores[0], dtype=np.float64)
+        by_rrf = valid[np.argsort(-rrf[valid], kind="stable")]
+        _, first_rrf = np.unique(app_numbers[by_rrf], return_index=True)
+        patent_rrf = rrf[by_rrf[first_rrf]]
+        order = np.argsort(-patent_rrf, kind="stable")
+    else:
+        order = np.argsort(distances[best], kind="stable")
+
+    # 4. 사용자가 원하는 개수(target_k)만큼 자르기
+    if target_k is not None:
+        order = order[:target_k]
+
+    final_results = []
+    for position in order:
+        i = best[position]
+        final_results.append({
+            "metadata": metadatas[i],
+            "document": documents[i],
+            "distance": float(distances[i]),
+            "rrf_score": float(patent_rrf[position]) if patent_rrf is not None else None
+        })
     return final_results
 
-def search_query(query_text, db_path="./patent_chroma_db", collection_name="patents", model_name="gemini-embedding-001", n_results=20):
+class PatentRetriever:
+    """
+    ChromaDB 클라이언트, 임베딩 함수, 컬렉션 핸들을 프로세스 당 한 번만 생성해 재사용하는 검색 서비스.
+
+    초기화와 reload 는 락으로 보호되며, 쿼리는 Flask 워커 스레드들이 동시에 호출해도 안전합니다.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME, model_name=DEFAULT_EMBEDDING_MODEL,
+                 embedding_cache=None, lexical_index_path=DEFAULT_BM25_PATH, embedding_function=None,
+                 vector_index_path=DEFAULT_VECTOR_INDEX_PATH):
+        self.db_path = db_path
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.embedding_cache = embedding_cache
+        self.lexical_index_path = lexical_index_path
+        self.vector_index_path = vector_index_path
+        # embedding_function 을 주면 Gemini 대신 사용 (오프라인 벤치마크/테스트용)
+        self.embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._client = None
+        self._embedding_func = None
+        self._collection = None
+        self._lexical_index = None
+        self._lexical_loaded = False
+        self._vector_index = None
+        self._vector_loaded = False
+        self._vector_warned = False
+        # reload 될 때마다 증가 (컬렉션 재구축 감지용)
+        self.generation = 0
+
+    def _open(self):
+        client = chromadb.PersistentClient(path=self.db_path)
+        collection = client.get_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_func
+        )
+        self._client, self._collection = client, collection
+
+    @property
+    def collection(self):
+        """컬렉션 핸들을 반환합니다. 처음 호출될 때 한 번만 DB를 엽니다."""
+        collection = self._collection
+        if collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._open()
+                collection = self._collection
+        return collection
+
+    def warm_up(self):
+        """앱 시작 시 DB와 컬렉션을 미리 열어 첫 요청의 지연을 없앱니다. (mmap 백엔드면 벡터 색인만 엽니다)"""
+        vector_index = self._vector_for(None)
+        if vector_index is not None:
+            logger.info("벡터 색인 '%s' (청크 %d개, %s)을 불러왔습니다.", self.vector_index_path, len(vector_index),
+                        vector_index.meta["dtype"])
+            return vector_index
+        collection = self.collection
+        logger.info("'%s' 컬렉션 (문서 %d개)을 성공적으로 불러왔습니다.", self.collection_name, collection.count())
+        return collection
+
+    def reload(self):
+        """컬렉션이 재구축되었을 때 호출합니다. 기존 핸들을 버리고 DB와 BM25 역색인을 다시 엽니다."""
+        with self._lock:
+            self._open()
+            self._lexical_index, self._lexical_loaded = None, False
+            self._vector_index, self._vector_loaded, self._vector_warned = None, False, False
+            self.generation += 1
+        return self._collection
+
+    def fingerprint(self):
+        """
+        컬렉션 내용이 바뀌었는지 판단하는 값 (reload 횟수, 적재 표시 파일의 수정 시각). 검색 결과에 의존하는 캐시의 무효화에 사용합니다.
+        요청마다 호출되므로 DB 를 조회하지 않고 파일 stat 한 번으로 구합니다.
+        같은 문서 수로 특허를 갱신하는 증분 적재도 module.Ingestion 이 표시 파일을 갱신하므로 감지됩니다.
+        """
+        try:
+            version = os.stat(content_version_path(self.db_path, self.collection_name)).st_mtime_ns
+        except OSError:
+            version = None
+        return self.generation, version
+
+    @property
+    def lexical_index(self):
+        """BM25 역색인을 반환합니다. 역색인 파일이 없으면 None 입니다."""
+        if not self._lexical_loaded:
+            with self._lock:
+                if not self._lexical_loaded:
+                    if self.lexical_index_path and os.path.isdir(self.lexical_index_path):
+                        try:
+                            self._lexical_index = BM25Index.load(self.lexical_index_path)
+                        except Exception as e:
+                            logger.warning("BM25 역색인 로드 실패, 벡터 검색만 사용합니다: %s", e)
+                    self._lexical_loaded = True
+        return self._lexical_index
+
+    @property
+    def vector_index(self):
+        """mmap 양자화 벡터 색인을 반환합니다. 색인 파일이 없으면 None 입니다."""
+        if not self._vector_loaded:
+            with self._lock:
+                if not self._vector_loaded:
+                    if self.vector_index_path and os.path.isdir(self.vector_index_path):
+                        try:
+                            self._vector_index = QuantizedVectorIndex.load(self.vector_index_path)
+                        except Exception as e:
+                            logger.warning("벡터 색인 로드 실패, Chroma 로 검색합니다: %s", e)
+                    self._vector_loaded = True
+        return self._vector_index
+
+    def _vector_for(self, backend):
+        """backend(생략 시 SEARCH_BACKEND)가 "mmap" 이고 색인이 있으면 색인을, 아니면 None(Chroma 사용)을 반환합니다."""
+        backend = SEARCH_BACKEND if backend is None else backend
+        if backend != "mmap":
+            return None
+        vector_index = self.vector_index
+        if vector_index is None and not self._vector_warned:
+            logger.warning("'%s' 에 벡터 색인이 없어 Chroma 로 검색합니다.", self.vector_index_path)
+            self._vector_warned = True
+        return vector_index
+
+    @property
+    def embedding_func(self):
+        """쿼리 임베딩 함수. mmap 백엔드에서도 쓰이므로 Chroma 를 열지 않고 만듭니다."""
+        if self._embedding_func is None:
+            with self._lock:
+                if self._embedding_func is None:
+                    # 임베딩 함수 설정 (DB에 저장할 때 사용한 것과 동일해야 함, 여러 텍스트는 배치 요청 한 번으로 임베딩)
+                    self._embedding_func = self.embedding_function or BatchEmbeddingFunction(
+                        api_key=GOOGLE_API_KEY,
+                        model_name=self.model_name
+                    )
+        return self._embedding_func
+
+    def embed_query(self, query_text):
+        """쿼리 임베딩을 캐시에서 찾고, 없으면 임베딩 API를 호출한 뒤 캐시에 저장합니다."""
+        cache = self.embedding_cache
+        if cache is not None:
+            vector = cache.get(self.model_name, query_text)
+            if vector is not None:
+                return vector
+        with span("embedding"):
+            vector = [float(v) for v in self.embedding_func([query_text])[0]]
+        if cache is not None:
+            cache.put(self.model_name, query_text, vector)
+        return vector
+
+    def embed_queries(self, query_texts):
+        """
+        여러 쿼리의 임베딩을 반환합니다. 캐시에 없는 쿼리만 모아(중복 제거) 배치 임베딩 요청으로 구합니다
+        (100개 이하면 요청 한 번, 그 이상이면 배치 여러 개를 동시에 보냄).
+        """
+        cache = self.embedding_cache
+        vectors = [None] * len(query_texts)
+        if cache is not None:
+            for i, text in enumerate(query_texts):
+                vectors[i] = cache.get(self.model_name, text)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            texts = list(dict.fromkeys(query_texts[i] for i in missing))
+            with span("embedding_batch"):
+                embedded = self.embedding_func(texts)
+            by_text = {}
+            for text, vector in zip(texts, embedded):
+                by_text[text] = [float(v) for v in vector]
+                if cache is not None:
+                    cache.put(self.model_name, text, by_text[text])
+            for i in missing:
+                vectors[i] = by_text[query_texts[i]]
+        return vectors
+
+    def query_many(self, query_embeddings, n_results=20, backend=None, search_filter=None):
+        """
+        여러 쿼리 임베딩을 collection.query 한 번으로 검색합니다. 결과의 i 번째 행이 i 번째 쿼리의 결과입니다.
+        search_filter(SearchFilter)를 주면 Chroma where 절 / mmap 행 마스크로 검색 단계에서 바로 거릅니다.
+        """
+        vector_index = self._vector_for(backend)
+        if vector_index is not None:
+            with span("mmap_query_batch"):
+                return vector_index.query(query_embeddings, n_results=n_results,
+                                          mask=vector_index.filter_mask(search_filter))
+        with span("chroma_query_batch"):
+            return self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=search_filter.where() if search_filter else None,
+                include=["metadatas", "documents", "distances"]
+            )
+
+    def query(self, query_text, n_results=20, query_embedding=None, backend=None, search_filter=None):
+        if query_embedding is None:
+            query_embedding = self.embed_query(query_text)
+        vector_index = self._vector_for(backend)
+        if vector_index is not None:
+            with span("mmap_query"):
+                return vector_index.query([query_embedding], n_results=n_results,
+                                          mask=vector_index.filter_mask(search_filter))
+        with span("chroma_query"):
+            return self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=search_filter.where() if search_filter else None,
+                include=["metadatas", "documents", "distances"] # 거리(유사도)도 포함
+            )
+
+    def hybrid_query(self, query_text, n_results=20, query_embedding=None, vector_results=None, backend=None,
+                     search_filter=None):
+        """
+        벡터 검색 결과와 BM25 역색인 결과를 Reciprocal Rank Fusion 으로 합쳐 상위 n_results 개 청크를 반환합니다.
+
+        반환 형식은 collection.query 와 같으며 "rrf_scores" 가 추가됩니다.
+        역색인에서만 찾은 청크의 distance 는 저장된 임베딩과 쿼리 임베딩으로 직접 계산합니다.
+        query_embedding / vector_results 를 주면 (배치 검색에서 이미 구한 값) 임베딩과 벡터 검색을 다시 하지 않습니다.
+        search_filter 는 벡터 검색과 BM25 검색 양쪽에 같은 조건으로 적용됩니다.
+        """
+        if query_embedding is None:
+            query_embedding = self.embed_query(query_text)
+        if vector_results is None:
+            vector_results = self.query(query_text, n_results, query_embedding=query_embedding, backend=backend,
+                                        search_filter=search_filter)
+        lexical_index = self.lexical_index
+        if lexical_index is None:
+            return vector_results
+        with span("lexical_query"):
+            lexical_hits = lexical_index.search(query_text, top_k=n_results,
+                                                mask=lexical_index.filter_mask(search_filter))
+        if not lexical_hits:
+            return vector_results
+
+        chunks = {}
+        for i, chunk_id in enumerate(vector_results['ids'][0]):
+            chunks[chunk_id] = (vector_results['documents'][0][i], vector_results['metadatas'][0][i], vector_results['distances'][0][i])
+
+        fused = reciprocal_rank_fusion([vector_results['ids'][0], [chunk_id for chunk_id, _ in lexical_hits]])[:n_results]
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in chunks]
+        vector_index = self._vector_for(backend)
+        if missing and vector_index is not None:
+            with span("mmap_get"):
+                fetched = vector_index.get(missing, query_embedding)
+            for i, chunk_id in enumerate(fetched['ids']):
+                chunks[chunk_id] = (fetched['documents'][i], fetched['metadatas'][i], fetched['distances'][i])
+        elif missing:
+            with span("chroma_get"):
+                fetched = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            if len(fetched['ids']):
+                embeddings = np.asarray(fetched['embeddings'], dtype=np.float32)
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                similarities = embeddings @ query_vector / (
+                    np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_vector) + 1e-12
+                )
+                for i, chunk_id in enumerate(fetched['ids']):
+                    chunks[chunk_id] = (fetched['documents'][i], fetched['metadatas'][i], float(1 - similarities[i]))
+
+        fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in chunks]
+        logger.info("[하이브리드 검색] 벡터 %d개 + BM25 %d개 -> %d개 (BM25 단독 %d개)",
+                    len(vector_results['ids'][0]), len(lexical_hits), len(fused), len(missing))
+        return {
+            "ids": [[chunk_id for chunk_id, _ in fused]],
+            "documents": [[chunks[chunk_id][0] for chunk_id, _ in fused]],
+            "metadatas": [[chunks[chunk_id][1] for chunk_id, _ in fused]],
+            "distances": [[chunks[chunk_id][2] for chunk_id, _ in fused]],
+            "rrf_scores": [[score for _, score in fused]],
+        }
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+def get_retriever(db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME, model_name=DEFAULT_EMBEDDING_MODEL, embedding_function=None):
+    """
+    (db_path, collection_name, model_name) 조합별로 프로세스 당 하나의 PatentRetriever 를 반환합니다.
+    embedding_function 은 해당 조합의 검색 서비스가 처음 만들어질 때만 적용됩니다.
+    """
+    key = (db_path, collection_name, model_name)
+    with _retrievers_lock:
+        retriever = _retrievers.get(key)
+        if retriever is None:
+            retriever = PatentRetriever(db_path, collection_name, model_name, embedding_cache=get_embedding_cache(),
+                                        embedding_function=embedding_function)
+            _retrievers[key] = retriever
+    return retriever
+
+def search_query(query_text, db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME, model_name=DEFAULT_EMBEDDING_MODEL,
+                 n_results=20, hybrid=None, unique_k=None, max_fetch=UNIQUE_FETCH_CAP, backend=None,
+                 date_from=None, date_to=None, applicants=None, exclude_applicants=None):
     """
     지정된 ChromaDB에서 아이디어(쿼리 텍스트)를 검색합니다.
+
+    unique_k 를 지정하면 n_results 개 청크부터 시작해 서로 다른 특허가 unique_k 개 모일 때까지
+    검색 범위를 두 배씩 늘리며(최대 max_fetch), 상위 unique_k 개 특허를 반환합니다.
+    쿼리 임베딩은 캐시되므로 추가 검색은 원격 임베딩 호출 없이 Chroma 조회만 반복합니다.
+    hybrid / backend 를 생략하면 HYBRID_SEARCH_ENABLED / SEARCH_BACKEND 를 따릅니다.
+    backend="mmap" 이면 Chroma 대신 module.VectorIndex 로 내보낸 양자화 색인에서 검색합니다.
+    date_from / date_to("2015", "2015-03-01" 등)와 applicants / exclude_applicants(출원인 이름 목록)를 주면
+    해당 조건을 만족하는 특허 안에서만 검색합니다 (module.Filters.SearchFilter 참고).
     """
-    print(f"\n--- 테스트 검색 시작 ---")
-    print(f"Query: '{query_text}'")
+    hybrid = HYBRID_SEARCH_ENABLED if hybrid is None else hybrid
+    search_filter = SearchFilter(date_from, date_to, applicants, exclude_applicants)
+    log_payload("[검색 쿼리]", query_text)
+    if search_filter:
+        logger.info("[검색 필터] %s", search_filter.to_dict())
     
     try:
-        # 1. DB 클라이언트 초기화
-        client = chromadb.PersistentClient(path=db_path)
-        
-        # 2. 임베딩 함수 설정 (DB에 저장할 때 사용한 것과 동일해야 함)
+        # 1. 프로세스 공용 검색 서비스에서 컬렉션 가져오기
+        retriever = get_retriever(db_path, collection_name, model_name)
         try:
-            embedding_func = embedding_functions.GoogleGenerativeAiEmbeddingFunction(
-    api_key=GOOGLE_API_KEY,
-    model_name=model_name # 최신 모델 권장
-)
+            if retriever._vector_for(backend) is None:
+                retriever.collection
         except Exception as e:
-            print(f"검색을 위한 임베딩 모델 로드 중 오류 발생: {e}")
+            logger.error("'%s' 컬렉션 가져오기 중 오류 발생: %s", collection_name, e)
+            logger.error("'module.Ingestion.process_patents_to_chroma' 함수가 먼저 성공적으로 실행되었는지 확인하세요.")
             return
-        
-        # 3. 컬렉션 가져오기 (get_collection 사용)
+
+        with span("retrieval"):
+            fetch = n_results
+            while True:
+                # 2. 쿼리 실행 (BM25 역색인이 있으면 벡터 검색과 RRF 로 결합)
+                if hybrid:
+                    results = retriever.hybrid_query(query_text, n_results=fetch, backend=backend, search_filter=search_filter)
+                else:
+                    results = retriever.query(query_text, n_results=fetch, backend=backend, search_filter=search_filter)
+                num_chunks = len(results.get('ids', [[]])[0]) if results else 0
+
+                # 3. 결과 확인
+                if not num_chunks:
+                    logger.info("검색 결과가 없습니다.")
+                    return
+                with span("dedup"):
+                    unique_results = get_unique_patents(results, target_k=unique_k) #중복 특허 제거
+
+                # 원하는 특허 수를 채웠거나, 상한에 도달했거나, 컬렉션에 더 가져올 청크가 없으면 종료
+                if unique_k is None or len(unique_results) >= unique_k or fetch >= max_fetch or num_chunks < fetch:
+                    break
+                fetch = min(fetch * 2, max_fetch)
+                logger.info("서로 다른 특허 %d/%d개 -> 검색 범위를 %d개로 확장", len(unique_results), unique_k, fetch)
+
+        logger.info("검색 완료: 청크 %d개 -> 특허 %d개", num_chunks, len(unique_results))
+        return unique_results
+            
+    except Exception as e:
+        logger.exception("검색 중 예상치 못한 오류가 발생했습니다: %s", e)
+
+def _query_row(results, i):
+    """다중 쿼리 collection.query 결과에서 i 번째 쿼리의 결과만 단일 쿼리 형식으로 꺼냅니다."""
+    return {key: [results[key][i]] for key in ("ids", "documents", "metadatas", "distances")}
+
+def search_queries(query_texts, db_path=DEFAULT_DB_PATH, collection_name=DEFAULT_COLLECTION_NAME, model_name=DEFAULT_EMBEDDING_MODEL,
+                   n_results=20, hybrid=None, unique_k=None, max_fetch=UNIQUE_FETCH_CAP, backend=None,
+                   date_from=None, date_to=None, applicants=None, exclude_applicants=None):
+    """
+    search_query 의 배치 버전. 여러 쿼리를 한꺼번에 검색해 쿼리 순서대로 결과 목록을 반환합니다.
+
+    캐시에 없는 쿼리 임베딩은 한 번의 임베딩 요청으로 구하고, 벡터 검색도 다중 쿼리 collection.query 한 번으로 수행합니다.
+    unique_k 를 채우지 못한 쿼리만 모아 검색 범위를 두 배씩 늘려 다시 조회합니다.
+    각 항목은 search_query 와 같은 형식이며, 결과가 없거나 오류가 나면 None 입니다.
+    필터 인자는 모든 쿼리에 같은 조건으로 적용됩니다.
+    """
+    hybrid = HYBRID_SEARCH_ENABLED if hybrid is None else hybrid
+    search_filter = SearchFilter(date_from, date_to, applicants, exclude_applicants)
+    outputs = [None] * len(query_texts)
+    if not query_texts:
+        return outputs
+
+    try:
+        retriever = get_retriever(db_path, collection_name, model_name)
         try:
-            collection = client.get_collection(
-                name=collection_name,
-                embedding_function=embedding_func
-            )
-            print(f"'{collection_name}' 컬렉션 (문서 {collection.count()}개)을 성공적으로 불러왔습니다.")
+            if retriever._vector_for(backend) is None:
+                retriever.collection
         except Exception as e:
-            print(f"'{collection_name}' 컬렉션 가져오기 중 오류 발생: {e}")
-            print("'process_patents_to_chroma' 함수가 먼저 성공적으로 실행되었는지 확인하세요.")
-            return
+            logger.error("'%s' 컬렉션 가져오기 중 오류 발생: %s", collection_name, e)
+            return outputs
 
-        # 4. 쿼리 실행
-        results = collection.query(
-            query_texts=[query_text],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"] # 거리(유사도)도 포함
-        )
-        
-        print(f"\n--- 검색 결과 (상위 {len(results.get('ids', [[]])[0])}개) ---")
-        
-        # 5. 결과 출력
-        if not results or not results.get('ids', [[]])[0]:
-            print("검색 결과가 없습니다.")
-            return
-        results = get_unique_patents(results) #중복 특허 제거
+        with span("retrieval_batch"):
+            embeddings = retriever.embed_queries(list(query_texts))
+            active = list(range(len(query_texts)))
+            fetch = n_results
+            while active:
+                vector_results = retriever.query_many([embeddings[i] for i in active], n_results=fetch, backend=backend,
+                                                      search_filter=search_filter)
+                remaining = []
+                for row, i in enumerate(active):
+                    results = _query_row(vector_results, row)
+                    if hybrid:
+                        results = retriever.hybrid_query(query_texts[i], n_results=fetch, query_embedding=embeddings[i],
+                                                         vector_results=results, backend=backend,
+                                                         search_filter=search_filter)
+                    num_chunks = len(results['ids'][0])
+                    if not num_chunks:
+                        continue
+                    with span("dedup"):
+                        outputs[i] = get_unique_patents(results, target_k=unique_k)
+                    if not (unique_k is None or len(outputs[i]) >= unique_k or fetch >= max_fetch or num_chunks < fetch):
+                        remaining.append(i)
+                if remaining:
+                    fetch = min(fetch * 2, max_fetch)
+                    logger.info("서로 다른 특허를 채우지 못한 쿼리 %d개 -> 검색 범위를 %d개로 확장", len(remaining), fetch)
+                active = remaining
+
+        logger.info("배치 검색 완료: 쿼리 %d개 중 %d개 결과 있음", len(query_texts), sum(output is not None for output in outputs))
+        return outputs
 
-        return results
-            
     except Exception as e:
-        print(f"검색 중 예상치 못한 오류가 발생했습니다: {e}")
+        logger.exception("배치 검색 중 예상치 못한 오류가 발생했습니다: %s", e)
+        return outputs
@@ -0,0 +1,482 @@
+import os
+import json
+import time
+import array
+import shutil
+import hashlib
+import argparse
+import numpy as np
+
+from .Filters import DATE_FIELD, APPLICANT_FIELD
+from .Metrics import logger
+
+DEFAULT_VECTOR_INDEX_PATH = "./patent_vector_index"
+VECTOR_INDEX_DTYPE = "int8"        # "int8" (행별 배율 양자화) | "float16"
+IVF_DEFAULT_PROBES = 8             # IVF 검색 시 살펴볼 목록 수
+IVF_TRAIN_SAMPLE = 50_000          # k-means 학습에 쓸 최대 벡터 수
+IVF_TRAIN_ITERATIONS = 10
+SEARCH_BLOCK_ROWS = 65_536         # 전수 검색 시 한 번에 역양자화할 행 수
+EXPORT_BLOCK_ROWS = 4096           # 내보내기 시 본문/메타데이터 컬럼을 행 순서대로 다시 쓸 때 한 번에 옮기는 행 수
+
+DOCUMENT_COLUMN = "document"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def _quantize(vectors, dtype):
+    """정규화된 float32 벡터를 저장 형식으로 바꿉니다. 반환값: (양자화 벡터, 행별 배율 또는 None)"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _id_hash(chunk_id):
+    """청크 id 의 64비트 해시 (프로세스와 무관하게 같은 값)."""
+    return int.from_bytes(hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class _ColumnWriter:
+    """
+    내보내는 동안 컬럼 값을 행 순서대로 임시 파일에 이어 쓰는 작성기.
+    값은 UTF-8 문자열로 쓰고 숫자 컬럼인지 여부만 추적하므로, 본문과 메타데이터를 메모리에 모아 두지 않습니다.
+    """
+
+    def __init__(self, path, name, n_before=0):
+        self.raw_path = os.path.join(path, f"{name}.raw")
+        self._file = open(self.raw_path, "wb")
+        # 이전 페이지에 없던 컬럼이면 앞선 행들은 빈 값
+        self.lengths = array.array("I", [0]) * n_before
+        self.is_int = self.is_float = True
+        self.present = False
+
+    def append(self, values):
+        encoded = []
+        for value in values:
+            if value is not None:
+                self.present = True
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    self.is_int = self.is_float = False
+                elif not isinstance(value, int):
+                    self.is_int = False
+            encoded.append(("" if value is None else str(value)).encode("utf-8"))
+        self._file.write(b"".join(encoded))
+        self.lengths.extend(len(item) for item in encoded)
+
+    @property
+    def column_type(self):
+        """값이 있는 행이 모두 정수면 "int", 정수/실수면 "float", 그 밖에는 "str" (None 은 무시)."""
+        if self.present and self.is_int:
+            return "int"
+        if self.present and self.is_float:
+            return "float"
+        return "str"
+
+    def _blocks(self, order):
+        """order 순서로 (행 구간 시작, 끝, 구간의 UTF-8 바이트, 행별 길이) 를 EXPORT_BLOCK_ROWS 행씩 돌려줍니다."""
+        self._file.close()
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+        starts = np.zeros(len(lengths), dtype=np.int64)
+        starts[1:] = np.cumsum(lengths, dtype=np.int64)[:-1]
+        raw = np.memmap(self.raw_path, dtype=np.uint8, mode="r") if os.path.getsize(self.raw_path) else np.empty(0, np.uint8)
+        for start in range(0, len(order), EXPORT_BLOCK_ROWS):
+            rows = order[start:start + EXPORT_BLOCK_ROWS]
+            row_lengths = lengths[rows].astype(np.int64)
+            # 행별 바이트 구간을 이어 붙이는 gather 인덱스
+            positions = np.repeat(starts[rows] - (np.cumsum(row_lengths) - row_lengths), row_lengths)
+            positions += np.arange(len(positions))
+            yield start, start + len(rows), raw[positions], row_lengths
+        del raw
+        os.remove(self.raw_path)
+
+    def save(self, path, name, order):
+        """order 순서로 행을 다시 배치해 숫자 컬럼(<name>.npy) 또는 문자열 컬럼(_StringColumn 형식)으로 저장합니다."""
+        column_type = self.column_type
+        if column_type != "str":
+            values = np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+",
+                                               dtype=np.int64 if column_type == "int" else np.float64, shape=(len(order),))
+            parse = int if column_type == "int" else float
+            for start, end, data, row_lengths in self._blocks(order):
+                text = bytes(data).decode("utf-8")
+                bounds = np.concatenate([[0], np.cumsum(row_lengths)])
+                values[start:end] = [parse(text[a:b]) if b > a else 0 for a, b in zip(bounds[:-1], bounds[1:])]
+            values.flush()
+            return column_type
+
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.frombuffer(self.lengths, dtype=np.uint32)[order], dtype=np.int64)
+        data = np.lib.format.open_memmap(os.path.join(path, f"{name}.data.npy"), mode="w+", dtype=np.uint8,
+                                         shape=(int(offsets[-1]),))
+        for start, end, block, _ in self._blocks(order):
+            data[offsets[start]:offsets[end]] = block
+        data.flush()
+        np.save(os.path.join(path, f"{name}.offsets.npy"), offsets)
+        return column_type
+
+
+class _StringColumn:
+    """UTF-8 바이트를 이어 붙인 data 배열과 행별 offsets 로 이루어진 mmap 문자열 컬럼."""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, path, name):
+        return cls(np.load(os.path.join(path, f"{name}.data.npy"), mmap_mode="r"),
+                   np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return bytes(self.data[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+
+class QuantizedVectorIndex:
+    """
+    Chroma 컬렉션에서 내보낸 임베딩을 int8/float16 으로 양자화해 mmap 으로 검색하는 읽기 전용 벡터 색인.
+
+    여러 워커 프로세스가 Chroma 인스턴스를 각자 메모리에 올리는 대신 OS 페이지 캐시의 같은 페이지를 공유합니다.
+    디스크 구성 (export_vector_index 로 생성):
+      - meta.json: dtype, 차원, 행 수, 메타데이터 컬럼 타입, IVF 목록 수, 생성 시각
+      - vectors.npy (int8 | float16): 행마다 L2 정규화된 임베딩, scales.npy (float32): int8 행별 역양자화 배율
+      - ids.data.npy / ids.offsets.npy: 행 번호 -> Chroma 청크 id (UTF-8 CSR)
+      - id_hashes.npy (uint64), id_rows.npy (int64): 청크 id 해시 오름차순으로 정렬한 해시와 행 번호 (id -> 행 조회용)
+      - document.data.npy / document.offsets.npy: 청크 본문 (UTF-8 CSR)
+      - columns/<이름>.npy: 숫자 메타데이터 컬럼, columns/<이름>.data.npy + .offsets.npy: 문자열 메타데이터 컬럼
+      - ivf_centroids.npy, ivf_offsets.npy: IVF 목록별 중심과 행 구간 (행은 목록 순서로 정렬되어 저장됨)
+      - applicant_codes.npy (int32), applicants.json: 검색 필터용 행별 출원인 코드와 코드 -> 출원인 식별자 목록
+    """
+
+    def __init__(self, path, meta, ids, vectors, scales, documents, columns, centroids=None, list_offsets=None,
+                 applicant_codes=None, applicant_vocab=None, id_hashes=None, id_rows=None):
+        self.path = path
+        self.meta = meta
+        self.ids = ids
+        self.id_hashes = id_hashes
+        self.id_rows = id_rows
+        self.vectors = vectors
+        self.scales = scales
+        self.documents = documents
+        self.columns = columns
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.applicant_codes = applicant_codes
+        self.applicant_vocab = applicant_vocab
+        self._filter_warned = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, path=DEFAULT_VECTOR_INDEX_PATH):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if not os.path.exists(os.path.join(path, "ids.data.npy")):
+            raise ValueError(f"'{path}' 는 이전 형식의 벡터 색인입니다. export_vector_index 로 다시 내보내세요.")
+        ids = _StringColumn.load(path, "ids")
+        id_hashes = np.load(os.path.join(path, "id_hashes.npy"), mmap_mode="r")
+        id_rows = np.load(os.path.join(path, "id_rows.npy"), mmap_mode="r")
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if meta["dtype"] == "int8" else None
+
+        column_path = os.path.join(path, "columns")
+        columns = {}
+        for name, column_type in meta["columns"].items():
+            if column_type == "str":
+                columns[name] = _StringColumn.load(column_path, name)
+            else:
+                columns[name] = np.load(os.path.join(column_path, f"{name}.npy"), mmap_mode="r")
+
+        centroids = list_offsets = None
+        if meta.get("ivf_lists"):
+            centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+            list_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+
+        applicant_codes = applicant_vocab = None
+        if os.path.exists(os.path.join(path, "applicants.json")):
+            applicant_codes = np.load(os.path.join(path, "applicant_codes.npy"), mmap_mode="r")
+            with open(os.path.join(path, "applicants.json"), encoding="utf-8") as f:
+                applicant_vocab = json.load(f)
+        return cls(path, meta, ids, vectors, scales, _StringColumn.load(path, DOCUMENT_COLUMN), columns,
+                   centroids, list_offsets, applicant_codes, applicant_vocab, id_hashes, id_rows)
+
+    def _scores(self, queries, rows=None, start=None, end=None):
+        """queries(정규화, m x d) 와 지정한 행들의 코사인 유사도 (m x 행 수)."""
+        if rows is None:
+            block = np.asarray(self.vectors[start:end], dtype=np.float32)
+            scales = None if self.scales is None else self.scales[start:end]
+        else:
+            block = np.asarray(self.vectors[rows], dtype=np.float32)
+            scales = None if self.scales is None else self.scales[rows]
+        scores = queries @ block.T
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    @staticmethod
+    def _top_k(rows, scores, top_k):
+        if len(rows) > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def filter_mask(self, search_filter):
+        """
+        SearchFilter 를 만족하는 행의 bool 마스크. 조건이 없으면 None 입니다.
+        출원일 컬럼과 출원인 코드 배열은 mmap 이므로 워커 프로세스들이 같은 페이지를 공유합니다.
+        필터 정보 없이 내보낸 이전 색인이면 조건을 확인할 수 없으므로 모든 행을 제외하고, 다시 내보내라는 경고를 한 번 남깁니다.
+        """
+        if not search_filter:
+            return None
+        dates = self.columns.get(DATE_FIELD)
+        if dates is None or isinstance(dates, _StringColumn) or self.applicant_codes is None:
+            if not self._filter_warned:
+                logger.warning("벡터 색인 '%s' 에 검색 필터 필드가 없어 필터 검색 결과가 비어 있습니다. "
+                               "backfill_filter_fields 후 export_vector_index 로 다시 내보내세요.", self.path)
+                self._filter_warned = True
+            return np.zeros(len(self), dtype=bool)
+        return search_filter.mask(dates, self.applicant_codes, self.applicant_vocab)
+
+    def search(self, query_embeddings, top_k=20, probes=None, mask=None):
+        """
+        쿼리별 상위 top_k 행을 [(행 번호 배열, 코사인 유사도 배열), ...] 로 반환합니다 (유사도 내림차순).
+        IVF 목록이 있으면 중심이 가까운 probes 개 목록만, 없으면 전체 행을 블록 단위로 살펴봅니다.
+        mask(행별 bool 배열)를 주면 True 인 행만 후보로 삼습니다.
+        """
+        queries = _normalize(query_embeddings)
+        n_rows = len(self)
+        if not n_rows:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        if self.centroids is None:
+            best = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+            for start in range(0, n_rows, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, n_rows)
+                block_scores = self._scores(queries, start=start, end=end)
+                block_rows = np.arange(start, end)
+                if mask is not None:
+                    keep = mask[start:end]
+                    block_rows, block_scores = block_rows[keep], block_scores[:, keep]
+                for q in range(len(queries)):
+                    rows = np.concatenate([best[q][0], block_rows])
+                    scores = np.concatenate([best[q][1], block_scores[q]])
+                    best[q] = self._top_k(rows, scores, top_k)
+            return best
+
+        probes = IVF_DEFAULT_PROBES if probes is None else probes
+        centroid_scores = queries @ self.centroids.T
+        results = []
+        for q in range(len(queries)):
+            lists = np.argsort(-centroid_scores[q])[:probes]
+            rows = np.concatenate([np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if not len(rows):
+                results.append((rows.astype(np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            results.append(self._top_k(rows, self._scores(queries[q:q + 1], rows=rows)[0], top_k))
+        return results
+
+    def metadata(self, row):
+        return {name: (column[row] if isinstance(column, _StringColumn) else column[row].item())
+                for name, column in self.columns.items()}
+
+    def query(self, query_embeddings, n_results=20, probes=None, mask=None):
+        """collection.query 와 같은 형식(ids, documents, metadatas, distances)으로 검색 결과를 반환합니다."""
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for rows, scores in self.search(query_embeddings, n_results, probes, mask):
+            results["ids"].append([self.ids[row] for row in rows])
+            results["documents"].append([self.documents[row] for row in rows])
+            results["metadatas"].append([self.metadata(row) for row in rows])
+            results["distances"].append([float(1 - score) for score in scores])
+        return results
+
+    def rows_for(self, ids):
+        """
+        청크 id 들의 행 번호 배열 (오름차순, 없는 id 는 제외).
+        mmap 으로 읽는 정렬된 해시 배열에서 이진 탐색하므로 프로세스마다 id -> 행 사전을 만들지 않습니다.
+        """
+        ids = list(ids)
+        hashes = np.array([_id_hash(chunk_id) for chunk_id in ids], dtype=np.uint64)
+        lower = np.searchsorted(self.id_hashes, hashes, side="left")
+        upper = np.searchsorted(self.id_hashes, hashes, side="right")
+        rows = []
+        for chunk_id, start, end in zip(ids, lower, upper):
+            # 해시가 같은 행이 여럿이면 실제 id 로 확인
+            for row in self.id_rows[start:end]:
+                if self.ids[row] == chunk_id:
+                    rows.append(int(row))
+                    break
+        return np.sort(np.array(rows, dtype=np.int64))
+
+    def get(self, ids, query_embedding):
+        """청크 id 목록을 찾아 본문, 메타데이터, 쿼리와의 코사인 거리를 반환합니다. 없는 id 는 제외됩니다."""
+        rows = self.rows_for(ids)
+        scores = self._scores(_normalize(query_embedding), rows=rows)[0] if len(rows) else []
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows],
+            "metadatas": [self.metadata(row) for row in rows],
+            "distances": [float(1 - score) for score in scores],
+        }
+
+
+def _train_ivf(vectors, scales, n_lists, seed=0):
+    """저장된 벡터 일부로 구면 k-means 를 학습해 목록 중심(정규화, float32)을 반환합니다."""
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(vectors), size=min(len(vectors), IVF_TRAIN_SAMPLE), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    if scales is not None:
+        sample *= scales[sample_rows][:, None]
+    sample = _normalize(sample)
+
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = sample[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def export_vector_index(collection, path=DEFAULT_VECTOR_INDEX_PATH, dtype=None, ivf_lists=0, page_size=5000):
+    """
+    Chroma 컬렉션의 임베딩, 본문, 메타데이터를 페이지 단위로 읽어 QuantizedVectorIndex 형식으로 저장합니다.
+
+    ivf_lists 가 0 이면 전수 검색용, 1 이상이면 그 수만큼 k-means 목록으로 나눈 IVF 색인을 만듭니다.
+    본문과 메타데이터 컬럼은 페이지마다 임시 파일에 이어 쓴 뒤 마지막에 행 순서대로 다시 배치하므로,
+    컬렉션 크기와 관계없이 메모리에는 한 페이지와 행별 길이/해시 배열만 둡니다.
+    임시 디렉터리에 모두 쓴 뒤 교체하므로, 내보내는 중에도 기존 색인으로 검색할 수 있습니다.
+    dtype 을 생략하면 VECTOR_INDEX_DTYPE 을 따릅니다.
+    """
+    dtype = VECTOR_INDEX_DTYPE if dtype is None else dtype
+    if dtype not in ("int8", "float16"):
+        raise ValueError(f"unsupported dtype: {dtype}")
+
+    total = collection.count()
+    tmp_path = path.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    column_path = os.path.join(tmp_path, "columns")
+    os.makedirs(column_path)
+
+    id_writer = _ColumnWriter(tmp_path, "ids")
+    document_writer = _ColumnWriter(tmp_path, DOCUMENT_COLUMN)
+    columns = {}
+    id_hashes = array.array("Q")
+    applicant_codes, applicant_vocab = array.array("i"), {}
+    vectors = scales = None
+    offset = 0
+    while offset < total:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        page_rows = min(len(page["ids"]), total - offset)
+        embeddings = _normalize(page["embeddings"][:page_rows])
+        if vectors is None:
+            vectors = np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.raw.npy"), mode="w+",
+                                                dtype=np.int8 if dtype == "int8" else np.float16,
+                                                shape=(total, embeddings.shape[1]))
+            scales = np.ones(total, dtype=np.float32) if dtype == "int8" else None
+        quantized, page_scales = _quantize(embeddings, dtype)
+        vectors[offset:offset + page_rows] = quantized
+        if scales is not None:
+            scales[offset:offset + page_rows] = page_scales
+
+        page_ids = page["ids"][:page_rows]
+        metadatas = [metadata or {} for metadata in page["metadatas"][:page_rows]]
+        id_writer.append(page_ids)
+        id_hashes.extend(_id_hash(chunk_id) for chunk_id in page_ids)
+        document_writer.append(page["documents"][:page_rows])
+        for name in {name for metadata in metadatas for name in metadata} - columns.keys():
+            columns[name] = _ColumnWriter(column_path, name, n_before=offset)
+        for name, writer in columns.items():
+            writer.append([metadata.get(name) for metadata in metadatas])
+        applicant_codes.extend(applicant_vocab.setdefault(str(metadata.get(APPLICANT_FIELD) or ""), len(applicant_vocab))
+                               for metadata in metadatas)
+        offset += page_rows
+
+    n_rows = offset
+    dim = vectors.shape[1] if vectors is not None else 0
+    order = np.arange(n_rows)
+    meta = {"dtype": dtype, "dim": dim, "count": n_rows, "ivf_lists": 0, "created_at": time.time()}
+
+    if ivf_lists and n_rows:
+        n_lists = min(ivf_lists, n_rows)
+        centroids = _train_ivf(vectors[:n_rows], None if scales is None else scales[:n_rows], n_lists)
+        assignment = np.empty(n_rows, dtype=np.int64)
+        for start in range(0, n_rows, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, n_rows)
+            block = np.asarray(vectors[start:end], dtype=np.float32)
+            if scales is not None:
+                block *= scales[start:end][:, None]
+            assignment[start:end] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+        np.save(os.path.join(tmp_path, "ivf_centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_path, "ivf_offsets.npy"), list_offsets)
+        meta["ivf_lists"] = n_lists
+
+    # IVF 목록 순서(전수 검색이면 원래 순서)로 행을 다시 써서 목록마다 연속된 구간이 되게 함
+    final = np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.npy"), mode="w+",
+                                      dtype=np.int8 if dtype == "int8" else np.float16, shape=(n_rows, dim))
+    for start in range(0, n_rows, SEARCH_BLOCK_ROWS):
+        final[start:start + SEARCH_BLOCK_ROWS] = vectors[order[start:start + SEARCH_BLOCK_ROWS]]
+    final.flush()
+    del final, vectors
+    os.remove(os.path.join(tmp_path, "vectors.raw.npy"))
+    if scales is not None:
+        np.save(os.path.join(tmp_path, "scales.npy"), scales[:n_rows][order])
+
+    id_writer.save(tmp_path, "ids", order)
+    hashes = np.frombuffer(id_hashes, dtype=np.uint64)[order]
+    hash_order = np.argsort(hashes, kind="stable")
+    np.save(os.path.join(tmp_path, "id_hashes.npy"), hashes[hash_order])
+    np.save(os.path.join(tmp_path, "id_rows.npy"), hash_order.astype(np.int64))
+    document_writer.save(tmp_path, DOCUMENT_COLUMN, order)
+    meta["columns"] = {name: columns[name].save(column_path, name, order) for name in sorted(columns)}
+
+    if APPLICANT_FIELD in meta["columns"]:
+        np.save(os.path.join(tmp_path, "applicant_codes.npy"), np.frombuffer(applicant_codes, dtype=np.int32)[order])
+        with open(os.path.join(tmp_path, "applicants.json"), "w", encoding="utf-8") as f:
+            json.dump(list(applicant_vocab), f, ensure_ascii=False)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    old_path = path.rstrip("/") + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    print(f"벡터 색인 생성 완료: 청크 {n_rows}개, {dim}차원 {dtype}, IVF 목록 {meta['ivf_lists']}개 -> {path}")
+    return QuantizedVectorIndex.load(path)
+
+
+if __name__ == "__main__":
+    import chromadb
+    from .Retrieval import DEFAULT_DB_PATH, DEFAULT_COLLECTION_NAME
+
+    parser = argparse.ArgumentParser(description="Chroma 컬렉션을 mmap 양자화 벡터 색인으로 내보냅니다.")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--output", default=DEFAULT_VECTOR_INDEX_PATH)
+    parser.add_argument("--dtype", choices=["int8", "float16"], default=VECTOR_INDEX_DTYPE)
+    parser.add_argument("--ivf-lists", type=int, default=0, help="0 이면 전수 검색, 1 이상이면 IVF 목록 수 (예: 문서 수의 제곱근)")
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.db_path).get_collection(args.collection)
+    export_vector_index(collection, args.output, dtype=args.dtype, ivf_lists=args.ivf_lists)
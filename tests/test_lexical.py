@@ -0,0 +1,108 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from module import Lexical
+from module.Lexical import BM25Index, write_bm25_index, build_lexical_index, update_lexical_index
+from module.Rerank import char_ngrams
+
+WORDS = ["배터리", "냉각", "장치", "전극", "분리막", "센서", "제어", "모듈", "차량", "열교환", "electrode", "sensor"]
+
+
+class FakeCollection:
+    """_collection_pages / update_lexical_index 가 쓰는 Chroma collection.get 만 흉내 낸 메모리 컬렉션."""
+
+    def __init__(self, documents):
+        self.documents = dict(documents)
+
+    def get(self, ids=None, include=None, limit=None, offset=0):
+        if ids is None:
+            ids = list(self.documents)[offset:offset + limit if limit else None]
+        else:
+            ids = [chunk_id for chunk_id in ids if chunk_id in self.documents]
+        return {
+            "ids": ids,
+            "documents": [self.documents[chunk_id] for chunk_id in ids],
+            "metadatas": [{"ApplicationDate": "2020-01-01", "Applicant": "x"} for _ in ids],
+        }
+
+
+def random_documents(rng, n, prefix="P"):
+    return {f"{prefix}{i}_0": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12))) for i in range(n)}
+
+
+def brute_force_bm25(rows, query, deleted=(), ngram=Lexical.BM25_NGRAM, k1=Lexical.BM25_K1, b=Lexical.BM25_B):
+    """
+    BM25Index.search 와 같은 정의의 점수를 문서마다 직접 계산합니다.
+    rows 는 색인의 모든 행 (청크 id, 본문) 이고, deleted 행은 df/avgdl 에는 포함되지만 결과에서 빠집니다.
+    """
+    counts = [Counter(char_ngrams(text, ngram)) for _, text in rows]
+    n_live = len(rows) - len(deleted)
+    avgdl = sum(sum(c.values()) for c in counts) / len(rows)
+    scores = {}
+    for term in set(char_ngrams(query, ngram)):
+        df = sum(1 for c in counts if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (max(n_live - df, 0) + 0.5) / (df + 0.5))
+        for row, ((chunk_id, _), c) in enumerate(zip(rows, counts)):
+            if term in c and row not in deleted:
+                tf = c[term]
+                norm = k1 * (1 - b + b * sum(c.values()) / avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+def assert_matches(index, rows, deleted=()):
+    for query in ["배터리 냉각", "전극 분리막 센서", "electrode sensor 모듈", "차량 열교환 제어 장치"]:
+        expected = brute_force_bm25(rows, query, deleted)
+        result = dict(index.search(query, top_k=len(rows)))
+        assert result.keys() == expected.keys()
+        for chunk_id, score in expected.items():
+            assert result[chunk_id] == pytest.approx(score, rel=1e-4)
+
+
+def test_run_merge_matches_brute_force(tmp_path, monkeypatch):
+    # run 파일 여러 개가 만들어지도록 run 크기를 줄임
+    monkeypatch.setattr(Lexical, "BM25_RUN_DOCS", 7)
+    documents = random_documents(random.Random(0), 50)
+    pages = [(list(documents)[start:start + 13], list(documents.values())[start:start + 13], None) for start in range(0, 50, 13)]
+
+    assert write_bm25_index(pages, str(tmp_path / "bm25")) == 50
+    index = BM25Index.load(str(tmp_path / "bm25"))
+
+    for term_id in range(len(index.vocab)):
+        docs = index.postings_doc[index.offsets[term_id]:index.offsets[term_id + 1]]
+        assert (docs[1:] > docs[:-1]).all()
+    assert_matches(index, list(documents.items()))
+
+
+def test_delta_update_matches_brute_force(tmp_path, monkeypatch):
+    monkeypatch.setattr(Lexical, "BM25_RUN_DOCS", 9)
+    monkeypatch.setattr(Lexical, "LEXICAL_DELTA_MAX_FRACTION", 0.5)
+    rng = random.Random(1)
+    path = str(tmp_path / "bm25")
+    collection = FakeCollection(random_documents(rng, 40))
+    build_lexical_index(collection, path, page_size=11)
+    base_rows = list(collection.documents.items())
+
+    # 두 번에 걸쳐 바꾸고, 추가하고, 지움 (두 번째 갱신은 기존 delta 를 다시 씀)
+    collection.documents.update({"P3_0": "배터리 냉각 냉각 전극", "N1_0": "센서 모듈 electrode"})
+    update_lexical_index(collection, {"P3_0", "N1_0"}, set(), path, page_size=5)
+    collection.documents.update({"N1_0": "차량 열교환", "N2_0": "분리막 분리막 제어"})
+    del collection.documents["P5_0"]
+    index = update_lexical_index(collection, {"N1_0", "N2_0"}, {"P5_0"}, path, page_size=5)
+
+    assert len(index) == len(collection.documents)
+    delta_rows = [(chunk_id, collection.documents[chunk_id]) for chunk_id in index.delta.ids]
+    assert sorted(index.delta.ids) == ["N1_0", "N2_0", "P3_0"]
+    rows = base_rows + delta_rows
+    deleted = {row for row, (chunk_id, _) in enumerate(base_rows) if chunk_id in ("P3_0", "P5_0")}
+    assert_matches(index, rows, deleted)
+
+    # 전체 재구축 결과는 현재 컬렉션 그대로와 일치
+    rebuilt = build_lexical_index(collection, path)
+    assert rebuilt.delta is None
+    assert_matches(rebuilt, list(collection.documents.items()))
@@ -0,0 +1,84 @@
+import numpy as np
+
+from module import VectorIndex
+from module.VectorIndex import export_vector_index, QuantizedVectorIndex
+from module.Filters import SearchFilter, filter_fields
+
+
+class FakeCollection:
+    """export_vector_index 가 쓰는 Chroma collection.count / get 만 흉내 낸 메모리 컬렉션."""
+
+    def __init__(self, ids, embeddings, documents, metadatas):
+        self.ids, self.embeddings, self.documents, self.metadatas = ids, embeddings, documents, metadatas
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include=None, limit=None, offset=0):
+        end = offset + limit
+        return {
+            "ids": self.ids[offset:end],
+            "embeddings": self.embeddings[offset:end],
+            "documents": self.documents[offset:end],
+            "metadatas": self.metadatas[offset:end],
+        }
+
+
+def make_collection(n=230, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"10-2020-{i:07d}_{i % 3}" for i in range(n)]
+    documents = [f"배터리 냉각 장치 {i} " + "전극" * (i % 7) for i in range(n)]
+    metadatas = []
+    for i in range(n):
+        metadata = {"ApplicationNumber": ids[i][:-2], "ApplicationDate": "" if i % 11 == 0 else f"2019{i % 12 + 1:02d}01",
+                    "Applicant": ["삼성전자", "LG전자", None][i % 3], "ChunkIndex": i % 3}
+        metadata = {key: value for key, value in metadata.items() if value is not None}
+        metadata.update(filter_fields(metadata))
+        # 뒤쪽 페이지에만 있는 컬럼과 정수/실수가 섞인 컬럼
+        if i >= 150:
+            metadata["Score"] = 0.5 if i % 2 else 2
+        metadatas.append(metadata)
+    return FakeCollection(ids, rng.normal(size=(n, dim)).astype(np.float32), documents, metadatas)
+
+
+def test_export_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(VectorIndex, "EXPORT_BLOCK_ROWS", 17)
+    collection = make_collection()
+    for ivf_lists in (0, 8):
+        index = export_vector_index(collection, str(tmp_path / "vi"), ivf_lists=ivf_lists, page_size=40)
+        assert len(index) == collection.count()
+        assert index.meta["columns"]["ChunkIndex"] == "int"
+        assert index.meta["columns"]["Score"] == "float"
+        assert index.meta["columns"]["Applicant"] == "str"
+
+        source_rows = {chunk_id: i for i, chunk_id in enumerate(collection.ids)}
+        for row in range(len(index)):
+            i = source_rows[index.ids[row]]
+            assert index.documents[row] == collection.documents[i]
+            metadata = index.metadata(row)
+            for key, value in collection.metadatas[i].items():
+                assert metadata[key] == value
+            assert metadata["Score"] == collection.metadatas[i].get("Score", 0)
+
+        wanted = [collection.ids[5], "missing_0", collection.ids[199], collection.ids[0]]
+        rows = index.rows_for(wanted)
+        assert sorted(index.ids[row] for row in rows) == sorted([collection.ids[0], collection.ids[5], collection.ids[199]])
+        fetched = index.get(wanted, collection.embeddings[5])
+        assert fetched["distances"][fetched["ids"].index(collection.ids[5])] < 0.05
+
+
+def test_filter_mask_matches_metadata(tmp_path):
+    collection = make_collection()
+    index = export_vector_index(collection, str(tmp_path / "vi"), ivf_lists=4, page_size=64)
+    search_filter = SearchFilter(date_from="2019-03", date_to="2019-08", exclude_applicants=["LG전자"])
+    mask = index.filter_mask(search_filter)
+    for row in range(len(index)):
+        assert mask[row] == search_filter.matches(index.metadata(row))
+
+
+def test_load_reads_without_building_id_dict(tmp_path):
+    collection = make_collection(n=50)
+    export_vector_index(collection, str(tmp_path / "vi"), page_size=20)
+    index = QuantizedVectorIndex.load(str(tmp_path / "vi"))
+    assert isinstance(index.id_hashes, np.memmap) and isinstance(index.ids.data, np.memmap)
+    assert not hasattr(index, "_rows_by_id")